@@ -4,6 +4,17 @@ import csv
 import re
 import requests
 import argparse
+import hashlib
+import json
+import glob
+import shutil
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from searchCEPTDocs import update_index
 
 
 # Function to sanitize the title to create a valid filename
@@ -18,88 +29,565 @@ def create_directory(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-# Function to download the file
-def download_file(url, file_path):
+# Upper bounds (ms) of the latency histogram buckets, the last bucket is everything above
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# HTTP status codes worth a retry (throttling and temporary server errors)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Class of a failed request for the error and retry counts, e.g. "HTTP 404" or "ConnectTimeout"
+def error_class(error):
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return f"HTTP {error.response.status_code}"
+    return type(error).__name__
+
+def is_retryable(error):
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUS_CODES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError))
+
+class DownloadTelemetry:
+    """Throughput, latency (time until the response headers) per host, retries and errors of the downloads.
+    progress() prints the state with an ETA at most every progress_interval seconds."""
+
+    def __init__(self, total_files=None, progress_interval=5.0):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.start = time.monotonic()
+        self.total_files = total_files
+        self.progress_interval = progress_interval
+        self.last_progress = self.start
+        self.files = Counter()  # downloaded, cached, failed
+        self.bytes = 0
+        self.hosts = {}  # host -> {'requests': n, 'bytes': n, 'latencies': [ms, ...]}
+        self.retries = Counter()
+        self.errors = Counter()
+
+    def host(self, url):
+        return self.hosts.setdefault(urlsplit(url).netloc, {'requests': 0, 'bytes': 0, 'latencies': []})
+
+    def response(self, url, response):
+        with self.lock:
+            host = self.host(url)
+            host['requests'] += 1
+            host['latencies'].append(response.elapsed.total_seconds() * 1000)
+
+    def received(self, url, size):
+        with self.lock:
+            self.bytes += size
+            self.host(url)['bytes'] += size
+
+    def retry(self, error):
+        with self.lock:
+            self.retries[error_class(error)] += 1
+
+    def error(self, error):
+        with self.lock:
+            self.errors[error_class(error)] += 1
+
+    def file_done(self, result):
+        with self.lock:
+            self.files[result] += 1
+        self.progress()
+
+    def progress(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_progress < self.progress_interval:
+            return
+        self.last_progress = now
+        elapsed = now - self.start
+        done = sum(self.files.values())
+        line = f"Progress: {done}"
+        if self.total_files:
+            line += f"/{self.total_files} files ({100 * done / self.total_files:.0f}%)"
+        else:
+            line += " files"
+        line += f", {self.bytes / 1e6:.1f} MB, {self.bytes / 1e6 / max(elapsed, 1e-9):.2f} MB/s"
+        if self.total_files and done:
+            remaining = elapsed / done * (self.total_files - done)
+            line += f", ETA {int(remaining // 60)}:{int(remaining % 60):02d}"
+        print(line)
+
+    @staticmethod
+    def latency_summary(latencies):
+        ordered = sorted(latencies)
+        buckets = {f"<={bound}": 0 for bound in LATENCY_BUCKETS_MS}
+        buckets[f">{LATENCY_BUCKETS_MS[-1]}"] = 0
+        for latency in ordered:
+            bound = next((bound for bound in LATENCY_BUCKETS_MS if latency <= bound), None)
+            buckets[f"<={bound}" if bound is not None else f">{LATENCY_BUCKETS_MS[-1]}"] += 1
+        percentile = lambda p: round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1) if ordered else None
+        return {'histogram_ms': buckets, 'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95), 'max_ms': percentile(1.0)}
+
+    def summary(self):
+        duration = time.monotonic() - self.start
+        return {'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                'duration_s': round(duration, 3),
+                'files': dict(self.files, total=self.total_files),
+                'bytes': self.bytes,
+                'bytes_per_second': round(self.bytes / max(duration, 1e-9)),
+                'hosts': {host: {'requests': values['requests'], 'bytes': values['bytes'],
+                                 'latency': self.latency_summary(values['latencies'])}
+                          for host, values in sorted(self.hosts.items())},
+                'retries': dict(self.retries),
+                'errors': dict(self.errors)}
+
+    def report(self, metrics_file=None):
+        self.progress(force=True)
+        summary = self.summary()
+        for host, values in summary['hosts'].items():
+            latency = values['latency']
+            print(f"{host}: {values['requests']} requests, {values['bytes'] / 1e6:.1f} MB, "
+                  f"latency p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, max {latency['max_ms']} ms")
+            print("    " + "  ".join(f"{bucket}: {count}" for bucket, count in latency['histogram_ms'].items()))
+        if summary['retries']:
+            print("Retries: " + ", ".join(f"{name} {count}" for name, count in sorted(summary['retries'].items())))
+        if summary['errors']:
+            print("Errors: " + ", ".join(f"{name} {count}" for name, count in sorted(summary['errors'].items())))
+        if metrics_file:
+            create_directory(os.path.dirname(os.path.abspath(metrics_file)))
+            with open(metrics_file, 'w', encoding='utf-8') as file:
+                json.dump(summary, file, indent=1)
+            print(f"Metrics saved to {metrics_file}")
+        return summary
+
+# Stream url into the open binary file (retrying temporary failures) and return the sha256 of the content.
+# headers: e.g. If-None-Match for a conditional GET, then None is returned if the content is not modified (304).
+# validators: dict that receives the ETag and Last-Modified of the response.
+def stream_download(url, file, telemetry=None, retries=0, headers=None, validators=None):
+    for attempt in range(retries + 1):
+        file.seek(0)
+        file.truncate()
+        sha256 = hashlib.sha256()
+        try:
+            with requests.get(url, stream=True, timeout=60, headers=headers) as response:
+                if telemetry:
+                    telemetry.response(url, response)
+                if response.status_code == 304:
+                    return None
+                response.raise_for_status()  # Check if the request was successful
+                if validators is not None:
+                    for name, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+                        if response.headers.get(header):
+                            validators[name] = response.headers[header]
+                for chunk in response.iter_content(chunk_size=65536):
+                    sha256.update(chunk)
+                    file.write(chunk)
+                    if telemetry:
+                        telemetry.received(url, len(chunk))
+            return sha256.hexdigest()
+        except requests.exceptions.RequestException as e:
+            if attempt == retries or not is_retryable(e):
+                if telemetry:
+                    telemetry.error(e)
+                raise
+            if telemetry:
+                telemetry.retry(e)
+            time.sleep(min(2 ** attempt, 30))
+
+# Function to download the file, returns the sha256 of the content (None on failure)
+def download_file(url, file_path, telemetry=None, retries=0):
+    temp_path = file_path + ".part"
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Check if the request was successful
-        with open(file_path, 'wb') as file:
-            file.write(response.content)
+        with open(temp_path, 'wb') as file:
+            digest = stream_download(url, file, telemetry, retries)
+        os.replace(temp_path, file_path)
         print(f"Downloaded: {file_path}")
+        if telemetry:
+            telemetry.file_done('downloaded')
+        return digest
     except requests.exceptions.RequestException as e:
         print(f"Failed to download {url}. Error: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if telemetry:
+            telemetry.file_done('failed')
+        return None
+
+# Content addressed store: every unique pdf is kept once in <store>/<sha256[:2]>/<sha256>.pdf.
+# urls.json maps every downloaded url to the hash of its content, the publication date and the ETag and
+# Last-Modified of the server. A known url is revalidated with a conditional GET (only 304 if unchanged);
+# without ETag and Last-Modified it is downloaded again when its publication date changes.
+def object_path(store_path, digest):
+    return os.path.join(store_path, digest[:2], digest + ".pdf")
+
+def load_url_manifest(store_path):
+    try:
+        with open(os.path.join(store_path, "urls.json"), encoding='utf-8') as file:
+            url_manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    # former format: url -> sha256
+    return {url: entry if isinstance(entry, dict) else {'sha256': entry} for url, entry in url_manifest.items()}
+
+URL_MANIFEST_LOCK = threading.Lock()
+
+# Exclusive access to urls.json for the threads of this process and other processes (lock file).
+# A lock file older than stale_seconds is left over from a crashed writer and is removed.
+@contextmanager
+def url_manifest_lock(store_path, stale_seconds=60):
+    lock_file = os.path.join(store_path, "urls.json.lock")
+    with URL_MANIFEST_LOCK:
+        while True:
+            try:
+                os.close(os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_file) > stale_seconds:
+                        os.remove(lock_file)
+                except OSError:
+                    pass
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.remove(lock_file)
+
+# Save the entries of url_manifest that changed since it was loaded (loaded: the manifest as loaded).
+# They are merged into the current urls.json, so concurrent mirrors into one store keep each other's entries.
+def save_url_manifest(store_path, url_manifest, loaded=None):
+    updates = {url: entry for url, entry in url_manifest.items() if loaded is None or loaded.get(url) != entry}
+    create_directory(store_path)
+    manifest_file = os.path.join(store_path, "urls.json")
+    with url_manifest_lock(store_path):
+        merged = load_url_manifest(store_path)
+        merged.update(updates)
+        temp_file = f"{manifest_file}.{os.getpid()}_{threading.get_ident()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(merged, file, indent=1, sort_keys=True)
+        os.replace(temp_file, manifest_file)
+
+def revalidation_headers(entry):
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+# Download the url into the store (unless the stored content is still current) and return the hash of its
+# content, None on failure
+def fetch_to_store(url, store_path, url_manifest, telemetry=None, retries=0, published=None):
+    entry = url_manifest.get(url, {})
+    known = entry.get('sha256') is not None and os.path.exists(object_path(store_path, entry['sha256']))
+    headers = revalidation_headers(entry) if known else {}
+    if known and not headers and entry.get('published') in (None, published):
+        # no validators of the server: the publication date tells whether the document was republished
+        if entry.get('published') is None and published is not None:
+            url_manifest[url] = dict(entry, published=published)
+        if telemetry:
+            telemetry.file_done('cached')
+        return entry['sha256']
+
+    create_directory(store_path)
+    temp_path = os.path.join(store_path, f"download_{os.getpid()}_{threading.get_ident()}_{hashlib.sha256(url.encode()).hexdigest()[:16]}.tmp")
+    validators = {}
+    try:
+        with open(temp_path, 'wb') as file:
+            digest = stream_download(url, file, telemetry, retries, headers, validators)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to download {url}. Error: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if telemetry:
+            telemetry.file_done('failed')
+        return None
+
+    if digest is None:  # 304: the stored content is current
+        os.remove(temp_path)
+        if entry.get('published') != published:
+            url_manifest[url] = dict(entry, published=published)
+        if telemetry:
+            telemetry.file_done('cached')
+        return entry['sha256']
+
+    target_path = object_path(store_path, digest)
+    if os.path.exists(target_path):
+        os.remove(temp_path)  # same content as a pdf we already have
+    else:
+        create_directory(os.path.dirname(target_path))
+        os.replace(temp_path, target_path)
+    url_manifest[url] = dict(validators, sha256=digest, published=published)
+    print(f"Downloaded: {url} -> {digest}")
+    if telemetry:
+        telemetry.file_done('downloaded')
+    return digest
+
+# Make file_path a hard link (or symbolic link) to the object in the store
+def materialize(object_file, file_path, creation_timestamp, link_mode):
+    create_directory(os.path.dirname(file_path))
+    if link_mode == "symlink":
+        if os.path.lexists(file_path):
+            os.remove(file_path)
+        os.symlink(os.path.relpath(object_file, os.path.dirname(file_path)), file_path)
+        # the link carries its own time: every name keeps its publication date
+        os.utime(file_path, (creation_timestamp, creation_timestamp), follow_symlinks=False)
+    else:
+        if os.path.lexists(file_path) and not (os.path.exists(file_path) and os.path.samefile(object_file, file_path)):
+            os.remove(file_path)
+        if not os.path.lexists(file_path):
+            os.link(object_file, file_path)
+        # hard links share the time of the object: keep the first publication date
+        if creation_timestamp < os.path.getmtime(object_file):
+            os.utime(object_file, (creation_timestamp, creation_timestamp))
+
+# Compile the selection flags into one predicate on a csv row
+def make_row_filter(active_only, get_reports, get_ecc_decisions, get_ec_decisions, get_recommendations):
+    # (substring of the document type, selected) in the order of the former checks
+    type_flags = [("EC Decision", get_ec_decisions),
+                  ("ECC Decision", get_ecc_decisions),
+                  ("Report", get_reports),
+                  ("Recommendation", get_recommendations)]
+    excluded_types = [type_name for type_name, selected in type_flags if not selected]
+
+    def row_filter(row):
+        if active_only and row['Status'] == "Withdrawn":
+            return False
+        doc_type = row['Type']
+        return not any(type_name in doc_type for type_name in excluded_types)
+
+    return row_filter
+
+# Generator of the csv rows
+def read_rows(csv_path):
+    with open(csv_path, mode='r', encoding='utf-8') as file:
+        yield from csv.DictReader(file, delimiter=';')
+
+# Generator of the download jobs (url, path, timestamp) of the selected rows
+def download_jobs(rows, row_filter, output_path):
+    for row in rows:
+        if not row_filter(row):
+            continue
+        pdf_url = row['pdf']
+        # Only attempt download if url is reasonably long
+        if len(pdf_url) <= 20:
+            continue
+        creation_time_struct = time.strptime(row['Publish Date'], "%Y-%m-%d")  # Convert to struct_time
+        creation_timestamp = time.mktime(creation_time_struct)  # Convert to seconds since epoch
+        # Create directory path based on Type and Status
+        directory_path = os.path.join(output_path, row['Type'].replace(" ", "_"), row['Status'])
+        sanitized_title = sanitize_filename(row['Title'])
+        pdf_urls = re.findall(r'http[^",]+', pdf_url)
+        for i, pdf_url in enumerate(pdf_urls):
+            #only add an index in case there are more than one pdf document to be downloaded.
+            if len(pdf_urls) > 1:
+                filename = f"{sanitized_title}_{i+1}.pdf"
+            else:
+                filename = f"{sanitized_title}.pdf"
+            yield pdf_url, os.path.join(directory_path, filename), creation_timestamp
+
+# Returns the size in bytes of the document behind the url, None if the server does not tell
+def get_download_size(session, url):
+    response = session.head(url, allow_redirects=True, timeout=30)
+    response.raise_for_status()
+    size = response.headers.get('Content-Length')
+    if size is None:
+        # Some servers only send the length on GET: read the headers and close without the body
+        with session.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            size = response.headers.get('Content-Length')
+    return int(size) if size is not None else None
 
-# Main function to process the CSV file
-def process_csv():
-
-    global file_path, input_csv, output_path, simulate, active_only, get_reports, get_all, get_ec_decisions, get_ecc_decisions, get_recommendations
-    with open(file_path, mode='r', encoding='utf-8') as file:
-        reader = csv.DictReader(file, delimiter=';')
-
-        #iterate over all lines in the csv file
-        for row in reader:
-
-            doc_type = row['Type']
-            print ("Doc_type "+doc_type)
-            
-            title = row['Title']
-            
-            status = row['Status']
-            print ("Status " + status)
-            if active_only:
-                if status=="Withdrawn":
-                    continue
-            if "EC Decision" in doc_type:
-                if not get_ec_decisions: 
-                    continue
-            if "ECC Decision" in doc_type:
-                if not get_ecc_decisions: 
-                    continue
-            if "Report" in doc_type:
-                if not get_reports:
-                    continue
-            if "Recommendation" in doc_type:
-                if not get_recommendations:
-                    continue
-            
-            print("Proceed with download...")
-            creation_date=row['Publish Date']
-            creation_time_struct = time.strptime(creation_date, "%Y-%m-%d")  # Convert to struct_time
-            creation_timestamp = time.mktime(creation_time_struct)  # Convert to seconds since epoch
-            pdf_url = row['pdf']
-            # Only attempt download if url is reasonably long
-            if (len(pdf_url)>20):
-                pdf_urls = re.findall(r'http[^",]+', pdf_url)
-                # pdf_url = re.search(r'"(http[^"]+)"', pdf_url).group(1)
-                for i, pdf_url in enumerate(pdf_urls):            
-                    # Sanitize title to create filename
-                    print("Title: " + title)
-                    
-                    sanitized_title = sanitize_filename(title)
-                    print("SaniTitle: " + sanitized_title)
-
-                    #only add an index in case there are more than one pdf document to be downloaded.
-                    if len(pdf_urls) > 1:
-                        sanitized_title = sanitized_title + "_" + str(i+1)
-                    filename = f"{sanitized_title}.pdf"
-
-                    # Create directory path based on Type and Status
-                    directory_path = os.path.join(output_path,doc_type.replace(" ", "_"), status)
-                    # Create directory (if not in simulate mode)
-                    if (simulate==False):
-                        create_directory(directory_path)
-
-                   # Full path to save the PDF
-                    file_path = os.path.join(directory_path, filename)
-                        
-                    if simulate:
-                        print("filepath: "+file_path)
-                        print(pdf_url)
-
-                    # Download the PDF (if not in simulate mode)
-                    if (simulate==False):
-                        download_file(pdf_url, file_path)
-                        os.utime(file_path, (creation_timestamp, creation_timestamp)) #set the creation time to publication date
+# Report the number of files and bytes of the jobs without downloading them
+def plan_downloads(jobs, workers):
+    jobs = list(jobs)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def head(job):
+        try:
+            return job, get_download_size(session, job[0]), None
+        except requests.exceptions.RequestException as e:
+            return job, None, e
+
+    total_bytes = 0
+    unknown_size = 0
+    failed = 0
+    per_directory = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (url, path, _), size, error in executor.map(head, jobs):
+            if error is not None:
+                print(f"Failed to get the size of {url}. Error: {error}")
+                failed += 1
+                continue
+            if size is None:
+                unknown_size += 1
+                size = 0
+            total_bytes += size
+            directory = os.path.dirname(path)
+            files, directory_bytes = per_directory.get(directory, (0, 0))
+            per_directory[directory] = (files + 1, directory_bytes + size)
+
+    for directory, (files, directory_bytes) in sorted(per_directory.items()):
+        print(f"{directory}: {files} files, {directory_bytes / 1e6:.1f} MB")
+    print(f"Total: {len(jobs)} files, {total_bytes / 1e6:.1f} MB ({unknown_size} without size, {failed} failed)")
+    return total_bytes
+
+# Sharding: the selected documents are partitioned by a stable hash of the url, shard i of N (1 <= i <= N) downloads
+# the urls with hash % N == i - 1. Every shard writes shard-<i>-of-<N>.manifest.json into its output path,
+# merge_shards() combines the shard trees into one Type/Status tree.
+def shard_of(url, shard_count):
+    return int(hashlib.sha256(url.encode('utf-8')).hexdigest()[:16], 16) % shard_count
+
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not of the form i/N")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {value!r}: i must be between 1 and N")
+    return index, count
+
+def shard_manifest_name(shard):
+    return f"shard-{shard[0]}-of-{shard[1]}.manifest.json"
+
+def write_manifest(manifest_file, shard, entries):
+    with open(manifest_file, 'w', encoding='utf-8') as file:
+        json.dump({'shard': shard, 'entries': entries}, file, indent=1)
+
+# Combine the trees and manifests of the shards below shard_paths into output_path (copies, or hard links where
+# possible). Documents are placed in the order of the csv, so a path used twice ends up as in a single run.
+def merge_shards(shard_paths, output_path, store=False, link_mode='hard'):
+    entries = []
+    shards = set()
+    for shard_path in shard_paths:
+        for manifest_file in sorted(glob.glob(os.path.join(shard_path, "shard-*-of-*.manifest.json"))):
+            with open(manifest_file, encoding='utf-8') as file:
+                manifest = json.load(file)
+            shards.add(tuple(manifest['shard']))
+            for entry in manifest['entries']:
+                entries.append(dict(entry, source=os.path.join(shard_path, entry['path'])))
+    counts = {count for _, count in shards}
+    missing = [f"{index}/{count}" for count in counts for index in range(1, count + 1) if (index, count) not in shards]
+    if len(counts) > 1 or missing:
+        print(f"Warning: incomplete or mixed shards (found {sorted(shards)}, missing {missing})")
+
+    entries.sort(key=lambda entry: entry['order'])
+    store_path = os.path.join(output_path, ".objects")
+    loaded = load_url_manifest(store_path) if store else None
+    url_manifest = dict(loaded) if store else None
+    merged = 0
+    for entry in entries:
+        if entry['sha256'] is None or not os.path.exists(entry['source']):
+            continue
+        target = os.path.join(output_path, entry['path'])
+        if store:
+            object_file = object_path(store_path, entry['sha256'])
+            if not os.path.exists(object_file):
+                copy_or_link(entry['source'], object_file)
+            materialize(object_file, target, entry['published'], link_mode)
+            url_manifest[entry['url']] = {'sha256': entry['sha256'], 'published': entry['published']}
+        elif not (os.path.exists(target) and os.path.samefile(entry['source'], target)):
+            copy_or_link(entry['source'], target)
+            os.utime(target, (entry['published'], entry['published'])) #set the creation time to publication date
+        merged += 1
+    if store:
+        save_url_manifest(store_path, url_manifest, loaded)
+
+    for entry in entries:
+        del entry['source']
+    create_directory(output_path)
+    write_manifest(os.path.join(output_path, "manifest.json"), None, entries)
+    failed = sum(1 for entry in entries if entry['sha256'] is None)
+    print(f"Merged {merged} documents from {len(shards)} shards into {output_path} ({failed} failed downloads)")
+    return merged
+
+def copy_or_link(source, target):
+    create_directory(os.path.dirname(target))
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:  # other file system or no hard links
+        shutil.copyfile(source, target)
+
+# Library API: mirror_docs() can be called from other programs, also concurrently from several threads.
+# The selection and the options are passed explicitly as a DocumentFilter and MirrorOptions.
+
+@dataclass(frozen=True)
+class DocumentFilter:
+    """Selection of the documents to download."""
+    active_only: bool = False
+    reports: bool = False
+    ecc_decisions: bool = False
+    ec_decisions: bool = False
+    recommendations: bool = False
+
+    @classmethod
+    def all_types(cls, active_only=False):
+        return cls(active_only, True, True, True, True)
+
+    def row_filter(self):
+        return make_row_filter(self.active_only, self.reports, self.ecc_decisions, self.ec_decisions, self.recommendations)
+
+@dataclass(frozen=True)
+class MirrorOptions:
+    simulate: bool = False  # only print the files and urls
+    plan: bool = False  # only report the number and size of the files
+    workers: int = 8  # concurrent requests of plan
+    store: bool = False  # content addressed store in <output_path>/.objects
+    link_mode: str = 'hard'
+    retries: int = 2
+    metrics_file: str = None  # None: <output_path>/download_metrics.json
+    index: bool = False  # update the full text search index
+    shard: tuple = None  # (i, N): only the documents of shard i of N, see shard_of()
+
+# Download the documents of the CEPT documents export input_csv selected by doc_filter into output_path.
+# Returns the download metrics (None with simulate and plan).
+def mirror_docs(input_csv, output_path, doc_filter=None, options=None):
+    doc_filter = doc_filter or DocumentFilter.all_types()
+    options = options or MirrorOptions()
+    jobs = download_jobs(read_rows(input_csv), doc_filter.row_filter(), output_path)
+    # the position in the csv is kept for the merge of the shards
+    numbered = [(order, job) for order, job in enumerate(jobs)
+                if options.shard is None or shard_of(job[0], options.shard[1]) == options.shard[0] - 1]
+    jobs = [job for _, job in numbered]
+
+    if options.plan:
+        plan_downloads(jobs, options.workers)
+        return None
+
+    if options.simulate:
+        for pdf_url, pdf_path, creation_timestamp in jobs:
+            print("filepath: " + pdf_path)
+            print(pdf_url)
+        return None
+
+    telemetry = DownloadTelemetry(total_files=len(jobs))
+    entries = []
+    try:
+        if options.store:
+            store_path = os.path.join(output_path, ".objects")
+            loaded = load_url_manifest(store_path)
+            url_manifest = dict(loaded)
+            try:
+                for order, (pdf_url, pdf_path, creation_timestamp) in numbered:
+                    digest = fetch_to_store(pdf_url, store_path, url_manifest, telemetry, options.retries, creation_timestamp)
+                    if digest:
+                        materialize(object_path(store_path, digest), pdf_path, creation_timestamp, options.link_mode)
+                    entries.append({'order': order, 'url': pdf_url, 'path': os.path.relpath(pdf_path, output_path),
+                                    'published': creation_timestamp, 'sha256': digest})
+            finally:
+                save_url_manifest(store_path, url_manifest, loaded)
+        else:
+            for order, (pdf_url, pdf_path, creation_timestamp) in numbered:
+                create_directory(os.path.dirname(pdf_path))
+                digest = download_file(pdf_url, pdf_path, telemetry, options.retries)
+                if os.path.exists(pdf_path):
+                    os.utime(pdf_path, (creation_timestamp, creation_timestamp)) #set the creation time to publication date
+                entries.append({'order': order, 'url': pdf_url, 'path': os.path.relpath(pdf_path, output_path),
+                                'published': creation_timestamp, 'sha256': digest})
+    finally:
+        summary = telemetry.report(options.metrics_file or os.path.join(output_path, "download_metrics.json"))
+        if options.shard:
+            write_manifest(os.path.join(output_path, shard_manifest_name(options.shard)), options.shard, entries)
+
+    if options.index:
+        update_index(output_path)
+    return summary
 
 # Argument parsing setup
 def parse_arguments():
@@ -111,7 +599,7 @@ def parse_arguments():
     parser.add_argument('--output-path', type=str, required=True, help="Path to where the documents are downloaded to.")
 
     # Argument for input CSV file
-    parser.add_argument('--input-csv', type=str, required=True, help="File and path to the input CSV file. *LATEST* will download the lates file from CEPT")
+    parser.add_argument('--input-csv', type=str, default=None, help="File and path to the input CSV file. *LATEST* will download the lates file from CEPT")
 
     # Optional argument to if we want just to simulate the downloads
     parser.add_argument('--simulate', action='store_true', help="Flag to enable the actual download or not.")
@@ -131,52 +619,77 @@ def parse_arguments():
     # Optional argument to control if we want to have the reports
     parser.add_argument('--get-recommendations', action='store_true', help="Flag to control if recommendations need to be downloaded.")
 
+    # Optional argument to only report the number of files and bytes to be downloaded
+    parser.add_argument('--plan', action='store_true', help="Flag to only report the number and size of the selected documents (HEAD requests, no download).")
+
+    # Optional argument for the number of concurrent requests of --plan
+    parser.add_argument('--workers', type=int, default=8, help="Number of concurrent requests. Default is 8.")
+
+    # Optional argument to keep every unique pdf once (content addressed) and link the Type/Status tree to it
+    parser.add_argument('--store', action='store_true', help="Flag to keep every document once in <output-path>/.objects and link the documents to it. Known urls are only downloaded again if the server reports a change (ETag/Last-Modified) or the publication date changed.")
+
+    # Optional argument for the kind of links of --store
+    parser.add_argument('--link-mode', choices=['hard', 'symlink'], default='hard', help="Links of --store: hard (default; all names share the first publication date) or symlink (every name keeps its publication date).")
+
+    # Optional argument for the number of retries of temporary failures (timeouts, connection errors, HTTP 429 and 5xx)
+    parser.add_argument('--retries', type=int, default=2, help="Number of retries of a download after a temporary failure. Default is 2.")
+
+    # Optional argument for the metrics file of the downloads
+    parser.add_argument('--metrics', type=str, default=None, help="Path to the JSON file with the download metrics (throughput, latency per host, retries, errors). Default is <output-path>/download_metrics.json.")
+
+    # Optional argument to update the full text search index after the download
+    parser.add_argument('--index', action='store_true', help="Flag to update the full text search index (searchCEPTDocs.py) with the new and changed documents. Needs pypdf.")
+
+    # Optional argument to download only a part of the documents (for several processes or machines)
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='i/N', help="Only download shard i of N (stable hash of the url) and write shard-i-of-N.manifest.json. Give all shards the same csv file, not LATEST.")
+
+    # Optional argument to combine shards into --output-path
+    parser.add_argument('--merge', type=str, nargs='+', default=None, metavar='SHARD_PATH', help="Combine the shard output paths into --output-path (uses --store and --link-mode). No download.")
+
     # Optional argument to control if we want to override and get all
     parser.add_argument('--get-all', action='store_true', help="Flag to control if all (active) documents need to be downloaded.")
 
     # Parse the arguments and return them
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.input_csv is None and not args.merge:
+        parser.error("--input-csv is required")
+    return args
 
 def main():
     # Parse arguments
     args = parse_arguments()
 
     # Accessing the parsed arguments
-    global file_path, input_csv, output_path, simulate, active_only, get_reports, get_all, get_ecc_decisions, get_ec_decisions, get_recommendations
     input_csv = args.input_csv
-    output_path = args.output_path
-    simulate = args.simulate
-    active_only = args.active_only
-    get_reports = args.get_reports
 
-    get_recommendations = args.get_recommendations
-    get_ecc_decisions = args.get_ecc_decisions
-    get_ec_decisions = args.get_ec_decisions
-    get_all = args.get_all
+    if args.merge:
+        merge_shards(args.merge, args.output_path, args.store, args.link_mode)
+        if args.index:
+            update_index(args.output_path)
+        return
 
     #get_all overrides decisions
-    if get_all:
-        get_reports = True
-        get_ecc_decisions = True
-        get_ec_decisions = True
-        get_recommendations = True
-        
-    print("Get_all " + str(get_all))
-    print("Get_reports " + str(get_reports))
-    print("Get_ecc_decisions " + str(get_ecc_decisions))
-    print("Get_recommendations " + str(get_recommendations))
-    print("Get_ec_decisions " + str(get_ec_decisions))
-
-    print(simulate)
+    if args.get_all:
+        doc_filter = DocumentFilter.all_types(args.active_only)
+    else:
+        doc_filter = DocumentFilter(args.active_only, args.get_reports, args.get_ecc_decisions, args.get_ec_decisions, args.get_recommendations)
+    options = MirrorOptions(args.simulate, args.plan, args.workers, args.store, args.link_mode, args.retries, args.metrics,
+                            args.index and not args.simulate and not args.plan, args.shard)
+
+    print("Get_all " + str(args.get_all))
+    print("Get_reports " + str(doc_filter.reports))
+    print("Get_ecc_decisions " + str(doc_filter.ecc_decisions))
+    print("Get_recommendations " + str(doc_filter.recommendations))
+    print("Get_ec_decisions " + str(doc_filter.ec_decisions))
+
+    print(args.simulate)
 
     if (input_csv=='LATEST'):
         input_csv = os.path.join('.', 'LATEST.csv')
-        download_file('https://docdb.cept.org/search/exportall', input_csv)
-
-    file_path=input_csv
+        download_file('https://docdb.cept.org/search/exportall', input_csv, retries=args.retries)
 
     # Process the CSV file
-    process_csv()
+    mirror_docs(input_csv, args.output_path, doc_filter, options)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,156 @@
+import os
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# pypdf is only needed to extract the text when (re)indexing
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+# Function to open (and create) the index database in the download directory
+def open_index(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute("""CREATE TABLE IF NOT EXISTS documents (
+                              path TEXT PRIMARY KEY, mtime REAL, size INTEGER,
+                              doc_type TEXT, status TEXT, publish_date TEXT, title TEXT)""")
+    connection.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS document_text
+                              USING fts5(path UNINDEXED, title, body)""")
+    return connection
+
+# Function to extract the text of a pdf (runs in the worker processes)
+def extract_text(pdf_path):
+    try:
+        reader = PdfReader(pdf_path)
+        return pdf_path, "\n".join(page.extract_text() or "" for page in reader.pages), None
+    except Exception as e:  # broken or encrypted pdf files must not stop the indexing
+        return pdf_path, "", str(e)
+
+# Generator of the pdf files of the <Type>/<Status>/ tree (the content store .objects is skipped)
+def find_documents(output_path):
+    for directory, subdirectories, filenames in os.walk(output_path):
+        subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+        for filename in filenames:
+            if filename.lower().endswith('.pdf'):
+                yield os.path.join(directory, filename)
+
+# Index the new and changed pdf files, drop the removed ones. Returns the number of (re)indexed files.
+def update_index(output_path, db_path=None, workers=None):
+    if PdfReader is None:
+        print("pypdf is not installed (pip install pypdf): the search index is not updated.")
+        return 0
+    if db_path is None:
+        db_path = os.path.join(output_path, "search_index.sqlite")
+
+    connection = open_index(db_path)
+    known = {path: (mtime, size) for path, mtime, size in connection.execute("SELECT path, mtime, size FROM documents")}
+
+    changed = []
+    present = set()
+    for pdf_path in find_documents(output_path):
+        relative_path = os.path.relpath(pdf_path, output_path)
+        present.add(relative_path)
+        # lstat: with --link-mode symlink the publication date is only set on the link, not on the stored object
+        mtime = os.lstat(pdf_path).st_mtime
+        size = os.stat(pdf_path).st_size
+        if known.get(relative_path) != (mtime, size):
+            changed.append((relative_path, (mtime, size)))
+
+    removed = set(known) - present
+    with connection:
+        for relative_path in removed:
+            connection.execute("DELETE FROM documents WHERE path = ?", (relative_path,))
+            connection.execute("DELETE FROM document_text WHERE path = ?", (relative_path,))
+
+    stats = dict(changed)
+    paths = [os.path.join(output_path, relative_path) for relative_path, _ in changed]
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor, connection:
+        for pdf_path, text, error in executor.map(extract_text, paths, chunksize=4):
+            if error is not None:
+                print(f"Failed to extract the text of {pdf_path}. Error: {error}")
+                failed += 1
+            relative_path = os.path.relpath(pdf_path, output_path)
+            mtime, size = stats[relative_path]
+            # <Type>/<Status>/<Title>.pdf, the mtime is the publication date (set by getAllCEPTDocs.py)
+            parts = relative_path.split(os.sep)
+            doc_type = parts[0].replace("_", " ") if len(parts) > 2 else ""
+            status = parts[1] if len(parts) > 2 else ""
+            title = os.path.splitext(parts[-1])[0]
+            publish_date = time.strftime("%Y-%m-%d", time.localtime(mtime))
+            connection.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (relative_path, mtime, size, doc_type, status, publish_date, title))
+            connection.execute("DELETE FROM document_text WHERE path = ?", (relative_path,))
+            connection.execute("INSERT INTO document_text (path, title, body) VALUES (?, ?, ?)", (relative_path, title, text))
+    connection.close()
+
+    print(f"Search index: {len(changed)} documents (re)indexed, {len(removed)} removed, {failed} without text.")
+    return len(changed)
+
+# Full text search. Returns (path, doc_type, status, publish_date, snippet) of the best matches.
+def search(db_path, query, doc_type=None, status=None, limit=20):
+    connection = open_index(db_path)
+    sql = """SELECT d.path, d.doc_type, d.status, d.publish_date, snippet(document_text, 2, '[', ']', '...', 12)
+             FROM document_text JOIN documents d ON d.path = document_text.path
+             WHERE document_text MATCH ?"""
+    parameters = [query]
+    if doc_type:
+        sql += " AND d.doc_type = ?"
+        parameters.append(doc_type)
+    if status:
+        sql += " AND d.status = ?"
+        parameters.append(status)
+    sql += " ORDER BY rank LIMIT ?"
+    parameters.append(limit)
+    results = connection.execute(sql, parameters).fetchall()
+    connection.close()
+    return results
+
+# Argument parsing setup
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+                description=("Full text search over the documents downloaded with getAllCEPTDocs.py. "
+                             "Example: python searchCEPTDocs.py --output-path ..\\..\\TestDownload --update --search \"short range devices\""))
+
+    # Argument for the path to the directories where the documents were downloaded to
+    parser.add_argument('--output-path', type=str, required=True, help="Path to where the documents were downloaded to.")
+
+    # Optional argument for the index database
+    parser.add_argument('--index-db', type=str, default=None, help="Path to the index database. Default is <output-path>/search_index.sqlite.")
+
+    # Optional argument to update the index before searching
+    parser.add_argument('--update', action='store_true', help="Flag to index the new and changed documents.")
+
+    # Optional argument for the number of worker processes extracting the text
+    parser.add_argument('--workers', type=int, default=None, help="Number of processes extracting the text. Default is the number of CPUs.")
+
+    # Optional search query (SQLite FTS5 syntax)
+    parser.add_argument('--search', type=str, default=None, help="Search query, e.g. \"radar AND 24 GHz\".")
+
+    # Optional filters of the search
+    parser.add_argument('--type', type=str, default=None, help="Only documents of this type, e.g. \"ECC Decisions\".")
+    parser.add_argument('--status', type=str, default=None, help="Only documents with this status, e.g. Active.")
+
+    # Parse the arguments and return them
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    db_path = args.index_db or os.path.join(args.output_path, "search_index.sqlite")
+
+    if args.update:
+        update_index(args.output_path, db_path, args.workers)
+
+    if args.search:
+        start = time.perf_counter()
+        results = search(db_path, args.search, args.type, args.status)
+        for path, doc_type, status, publish_date, snippet in results:
+            print(f"{publish_date}  {doc_type} / {status}  {path}")
+            print("    " + " ".join(snippet.split()))
+        print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,102 @@
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+from array import array
+import argparse
+import struct
 import string
+import json
+import sys
 
-# Register Arial font (Make sure you have 'arial.ttf' in the same directory or installed in your system)
-pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
+# Glyph metrics file (read with mmap by transformECATableDatacsv2pdf.py):
+#   header     8s magic, I number of fonts
+#   directory  per font: 32s font name (utf-8, zero padded), H default width, H reserved, I offset, I length
+#   tables     per font: uint16 little endian advance widths in 1/10000 em (1/10 of the ReportLab units),
+#              indexed by code point; 0 means that the font has no glyph for the code point.
+# Advance widths scale linearly with the font size, so one table per font serves every size.
+MAGIC = b'EFISGM01'
+HEADER = struct.Struct('<8sI')
+DIRECTORY_ENTRY = struct.Struct('<32sHHII')
 
-# Define the font name, size, and reference character for normalization
-font_name = "Arial"
-font_size = 8
-reference_char = 'A'
+def advance_width_table(ttf_filename):
+    """Returns the advance widths (without kerning) of all glyphs of the font and its default width."""
+    face = TTFontFace(ttf_filename)
+    widths = array('H', bytes(2 * (max(face.charWidths) + 1)))
+    for code_point, width in face.charWidths.items():
+        widths[code_point] = max(1, round(width * 10))
+    return widths, round(face.defaultWidth * 10)
 
-# Get the width of the reference character 'A'
-reference_width = pdfmetrics.stringWidth(reference_char, font_name, font_size)
+def compile_glyph_metrics(fonts, output_filename):
+    """fonts: list of (font name, TTF file). Writes the glyph metrics file."""
+    tables = [(name, *advance_width_table(ttf_filename)) for name, ttf_filename in fonts]
+    if sys.byteorder != 'little':
+        for _, widths, _ in tables:
+            widths.byteswap()
 
-# Characters to measure
-characters = string.ascii_letters + string.digits + "-() ."
+    offset = HEADER.size + DIRECTORY_ENTRY.size * len(tables)
+    with open(output_filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(tables)))
+        for name, widths, default_width in tables:
+            file.write(DIRECTORY_ENTRY.pack(name.encode('utf-8'), default_width, 0, offset, len(widths)))
+            offset += 2 * len(widths)
+        for _, widths, _ in tables:
+            widths.tofile(file)
 
-# Create the dictionary of relative widths
-relative_widths = {
-    char: pdfmetrics.stringWidth(char, font_name, font_size) / reference_width
-    for char in characters
-}
+    for name, widths, _ in tables:
+        print(f"{name}: {sum(1 for width in widths if width)} glyphs, code points up to {len(widths) - 1}")
+    print(f"Glyph metrics saved to '{output_filename}'.")
 
-# Print the dictionary
-print(relative_widths)
+def relative_widths_json(ttf_filename, output_filename):
+    # Register Arial font (Make sure you have 'arial.ttf' in the same directory or installed in your system)
+    pdfmetrics.registerFont(TTFont('Arial', ttf_filename))
 
-# Optionally, save the dictionary to a file
-import json
-with open("relative_widths.json", "w") as file:
-    json.dump(relative_widths, file, indent=4)
+    # Define the font name, size, and reference character for normalization
+    font_name = "Arial"
+    font_size = 8
+    reference_char = 'A'
+
+    # Get the width of the reference character 'A'
+    reference_width = pdfmetrics.stringWidth(reference_char, font_name, font_size)
+
+    # Characters to measure
+    characters = string.ascii_letters + string.digits + "-() ."
+
+    # Create the dictionary of relative widths
+    relative_widths = {
+        char: pdfmetrics.stringWidth(char, font_name, font_size) / reference_width
+        for char in characters
+    }
+
+    # Print the dictionary
+    print(relative_widths)
+
+    # Optionally, save the dictionary to a file
+    with open(output_filename, "w") as file:
+        json.dump(relative_widths, file, indent=4)
+
+    print(f"Relative widths saved to '{output_filename}'.")
+
+# Argument parsing setup
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compile the advance widths of TrueType fonts into a glyph metrics file.")
+
+    # Fonts to compile
+    parser.add_argument('--font', action='append', default=None, metavar='NAME=FILE',
+                        help="Font name and TTF file, e.g. Arial=arial.ttf. Can be given several times. Default is Arial=arial.ttf.")
+
+    # Argument for the output file
+    parser.add_argument('--output', type=str, default='glyph_metrics.bin', help="Path to the glyph metrics file. Default is 'glyph_metrics.bin'.")
+
+    # Optional argument for the former JSON file (Arial, letters, digits and "-() ." only)
+    parser.add_argument('--json', action='store_true', help="Flag to also write relative_widths.json as before.")
+
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    fonts = [font.split('=', 1) for font in (args.font or ['Arial=arial.ttf'])]
+    compile_glyph_metrics(fonts, args.output)
+    if args.json:
+        relative_widths_json(dict(fonts).get('Arial', 'arial.ttf'), "relative_widths.json")
 
-print("Relative widths saved to 'relative_widths.json'.")
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 import pandas as pd
 import sys
 import os
+import csv
+import glob
+import argparse
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
 
 def extract_tables_to_csv(input_filename):
     # Check if file exists
@@ -30,8 +35,186 @@ def extract_tables_to_csv(input_filename):
         table.to_csv(csv_filename, index=False)
         print(f"Saved: {csv_filename}")
 
+class StreamingTableWriter(HTMLParser):
+    """Writes every top level <table> to its own CSV file while the HTML is fed in chunks.
+    Only the current row is kept in memory. colspan and rowspan are expanded like pd.read_html does,
+    tables nested in a cell become part of the cell text."""
+
+    def __init__(self, output_prefix):
+        super().__init__(convert_charrefs=True)
+        self.output_prefix = output_prefix
+        self.tables = []  # (csv filename, rows, columns, status)
+        self.depth = 0
+        self.file = None
+        self.writer = None
+        self.row = None
+        self.cell = None
+        self.colspan = 1
+        self.rowspan = 1
+        self.pending_spans = {}  # column -> (remaining rows, text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.depth += 1
+            if self.depth == 1:
+                csv_filename = f"{self.output_prefix}_table_{len(self.tables)+1}.csv"
+                self.file = open(csv_filename, 'w', newline='', encoding='utf-8')
+                self.writer = csv.writer(self.file)
+                self.tables.append([csv_filename, 0, 0, "ok"])
+                self.pending_spans = {}
+        elif self.depth != 1:
+            if tag == 'br' and self.cell is not None:
+                self.cell.append(' ')
+        elif tag == 'tr':
+            # </td> and </tr> may be omitted: a new row ends the open row
+            self.end_row()
+            self.row = []
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            self.end_row()
+        elif tag in ('td', 'th'):
+            # a new cell ends the open cell, a cell without <tr> starts a row
+            self.end_cell()
+            if self.row is None:
+                self.row = []
+            attributes = dict(attrs)
+            self.cell = []
+            self.colspan = self.span(attributes.get('colspan'))
+            self.rowspan = self.span(attributes.get('rowspan'))
+        elif tag == 'br' and self.cell is not None:
+            self.cell.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            if self.depth == 1:
+                self.end_row()
+                self.file.close()
+                self.file = None
+            self.depth = max(self.depth - 1, 0)
+        elif self.depth != 1:
+            return
+        elif tag in ('td', 'th'):
+            self.end_cell()
+        elif tag in ('tr', 'thead', 'tbody', 'tfoot'):
+            self.end_row()
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    @staticmethod
+    def span(value):
+        try:
+            return max(int(value), 1)
+        except (TypeError, ValueError):
+            return 1
+
+    def fill_pending_spans(self):
+        # cells of earlier rows reaching into the current column (rowspan)
+        while len(self.row) in self.pending_spans:
+            column = len(self.row)
+            remaining, text = self.pending_spans[column]
+            self.row.append(text)
+            if remaining > 1:
+                self.pending_spans[column] = (remaining - 1, text)
+            else:
+                del self.pending_spans[column]
+
+    def end_cell(self):
+        if self.cell is None:
+            return
+        text = " ".join("".join(self.cell).split())
+        self.fill_pending_spans()
+        for _ in range(self.colspan):
+            if self.rowspan > 1:
+                self.pending_spans[len(self.row)] = (self.rowspan - 1, text)
+            self.row.append(text)
+        self.cell = None
+
+    def end_row(self):
+        self.end_cell()
+        if self.row is None:
+            return
+        self.fill_pending_spans()
+        if self.row:
+            self.writer.writerow(self.row)
+            table = self.tables[-1]
+            table[1] += 1
+            table[2] = max(table[2], len(self.row))
+        self.row = None
+
+    def close(self):
+        super().close()
+        if self.file is not None:
+            # the file ends inside a table: keep what was read, but report the table as failed
+            self.end_row()
+            self.file.close()
+            self.file = None
+            self.tables[-1][3] = "error: unclosed table"
+
+def stream_tables_to_csv(input_filename, output_dir, chunk_size=1 << 20):
+    """Extracts the tables of one HTML file chunk by chunk. Returns the manifest rows of the file."""
+    base_name = os.path.splitext(os.path.basename(input_filename))[0]
+    parser = StreamingTableWriter(os.path.join(output_dir, base_name))
+    try:
+        with open(input_filename, "r", encoding="utf-8", errors="replace") as file:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        parser.close()
+    except OSError as e:
+        parser.close()
+        return [(input_filename, "", 0, 0, f"error: {e}")]
+
+    if not parser.tables:
+        return [(input_filename, "", 0, 0, "no tables")]
+    return [(input_filename, csv_filename, rows, columns, status) for csv_filename, rows, columns, status in parser.tables]
+
+def expand_inputs(inputs):
+    """Files, directories (all *.htm/*.html files in them) and glob patterns to a sorted list of files."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for directory, _, filenames in os.walk(item):
+                files.update(os.path.join(directory, name) for name in filenames if name.lower().endswith(('.htm', '.html')))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            files.update(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+    return sorted(files)
+
+def batch_extract_tables(inputs, output_dir, workers=None):
+    """Extracts the tables of all input files in a process pool and writes one manifest.csv."""
+    files = expand_inputs(inputs)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_filename = os.path.join(output_dir, "manifest.csv")
+    # Several input files can have the same name in different directories: one output directory each
+    names = [os.path.splitext(os.path.basename(name))[0] for name in files]
+    output_dirs = [os.path.join(output_dir, str(i)) if names.count(name) > 1 else output_dir for i, name in enumerate(names)]
+    for directory in set(output_dirs):
+        os.makedirs(directory, exist_ok=True)
+
+    tables = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(manifest_filename, 'w', newline='', encoding='utf-8') as manifest:
+        writer = csv.writer(manifest)
+        writer.writerow(["input", "csv", "rows", "columns", "status"])
+        for rows in executor.map(stream_tables_to_csv, files, output_dirs):
+            writer.writerows(rows)
+            tables += sum(1 for row in rows if row[4] == "ok")
+    print(f"Extracted {tables} tables from {len(files)} files. Manifest: {manifest_filename}")
+    return manifest_filename
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python genWorkItemCSV.py <input_file>")
-    else:
+        print("       python genWorkItemCSV.py <file|directory|glob> [...] --output-dir <dir> [--workers N]")
+    elif len(sys.argv) == 2 and os.path.isfile(sys.argv[1]):
         extract_tables_to_csv(sys.argv[1])
+    else:
+        parser = argparse.ArgumentParser(description="Extract the tables of HTML work item dumps to CSV files.")
+        parser.add_argument('inputs', nargs='+', help="HTML files, directories or glob patterns.")
+        parser.add_argument('--output-dir', type=str, default='.', help="Directory for the CSV files and manifest.csv. Default is the current directory.")
+        parser.add_argument('--workers', type=int, default=None, help="Number of worker processes. Default is the number of CPUs.")
+        args = parser.parse_args()
+        batch_extract_tables(args.inputs, args.output_dir, args.workers)
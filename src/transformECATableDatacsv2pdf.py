@@ -1,4 +1,6 @@
 import pandas as pd
+import numpy as np
+from pandas.api.types import union_categoricals
 import os
 import re
 import csv
@@ -14,21 +16,80 @@ from reportlab.platypus import SimpleDocTemplate, Flowable, Table, TableStyle, P
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfgen.canvas import Canvas
+from reportlab import Version as reportlab_version
+from reportlab.lib.utils import TimeStamp
 import argparse
-from datetime import datetime
+from datetime import datetime, timezone
+import calendar
+import zlib
+import json
+import hashlib
+import mmap
+import struct
+import sys
+import io
+import contextlib
+import time
+import math
+import html
+import threading
+import functools
+import inspect
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+# pikepdf is optional: it is only needed to pack the objects into compressed object streams (--optimize-size)
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
 
 # Register Arial font
 pdfmetrics.registerFont(TTFont('Arial', 'Arial.ttf'))
 
-# Define the Timestamp
-timestamp = datetime.now()
+# Columns of the ECA table export: (name in the csv file, name used in the script)
+ECA_CSV_COLUMNS = [
+    ('Lower Frequency', 'Lower Frequency'),
+    ('Upper Frequency', 'Upper Frequency'),
+    ('RR Region 1 Allocation and RR footnotes applicable to CEPT', 'RR Region 1 Allocation'),
+    ('RR Region 1 frequency range footnotes', 'RR Region 1 Footnotes'),
+    ('European Common Allocation and ECA footnotes', 'European Common Allocation'),
+    ('ECA frequency range footnotes', 'ECA Footnotes'),
+    ('ECC/ERC harmonisation measure', 'ECC/ERC Harmonisation Measure'),
+    ('Applications', 'Applications'),
+    ('Standard', 'Standard'),
+    ('Notes', 'Notes'),
+]
+ECA_COLUMNS = [name for _, name in ECA_CSV_COLUMNS]
+# Columns with few distinct values (allocations, measures, applications, standards): stored as categoricals when read in chunks
+ECA_CATEGORICAL_COLUMNS = [name for name in ECA_COLUMNS if name not in ('Lower Frequency', 'Upper Frequency')]
+
+# ECO exports used for LATEST
+DOCDB_URL = 'https://docdb.cept.org/search/exportall'
+HARMSTAND_URL = 'https://docdb.cept.org/frequencies/export'
+ECA_URL = 'https://efis.cept.org/reports/ReportDownloader?reportid=3'
 
 class MyDocTemplate(SimpleDocTemplate):
-    """Custom SimpleDocTemplate to manage bookmarks and table of contents."""
+    """Custom SimpleDocTemplate to manage bookmarks and table of contents.
+    creation_time (datetime) replaces the current time as creation date of the PDF."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, creation_time=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.bookmarks = []
+        self.creation_time = creation_time
+
+    def _makeCanvas(self, *args, **kwargs):
+        canv = super()._makeCanvas(*args, **kwargs)
+        if self.creation_time is not None:
+            # per document, unlike SOURCE_DATE_EPOCH which is read from the environment of the process
+            stamp = TimeStamp(invariant=1)
+            stamp.t = calendar.timegm(self.creation_time.timetuple())  # naive time taken as UTC: independent of the time zone
+            stamp.lt = time.gmtime(stamp.t)
+            stamp.YMDhms = tuple(stamp.lt)[:6]
+            canv._doc._timeStamp = stamp
+        return canv
 
     def afterFlowable(self, flowable):
         """Capture the location of flowable for bookmarks."""
@@ -36,6 +97,25 @@ class MyDocTemplate(SimpleDocTemplate):
             self.canv.bookmarkPage(flowable._bookmark)  # Mark the page for the bookmark
             #self.canv.addOutlineEntry(flowable.text, flowable._bookmark, level=0)  # Add to outline
 
+class SharedFormFlowable(Flowable):
+    """Draws the wrapped flowable once into a named PDF form and only references the form on later occurrences."""
+
+    def __init__(self, form_name, flowable):
+        super().__init__()
+        self.form_name = form_name
+        self.flowable = flowable
+
+    def wrap(self, availWidth, availHeight):
+        self.width, self.height = self.flowable.wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def draw(self):
+        if not self.canv.hasForm(self.form_name):
+            self.canv.beginForm(self.form_name, lowerx=0, lowery=0, upperx=self.width, uppery=self.height)
+            self.flowable.drawOn(self.canv, 0, 0)
+            self.canv.endForm()
+        self.canv.doForm(self.form_name)
+
 def estimate_string_length(s):
     capital_letters=sum(1 for char in s if char.isupper())
     return ((len(s)-capital_letters)*0.7+capital_letters)
@@ -111,7 +191,121 @@ def parse_services_and_footnotes(input_string):
 
     return services
 
-def make_charwidth_lookup_table():
+# Radio Regulations (RR 5.26-5.29): the primary services (capitals) come before the secondary services and within
+# each category the services are listed in the alphabetical order of their French names.
+FRENCH_SERVICE_NAMES = {
+    'AMATEUR': "Amateur",
+    'AMATEUR SATELLITE': "Amateur par satellite",
+    'METEOROLOGICAL AIDS': "Auxiliaires de la météorologie",
+    'SPACE OPERATION': "Exploitation spatiale",
+    'EARTH EXPLORATION SATELLITE': "Exploration de la Terre par satellite",
+    'FIXED': "Fixe",
+    'FIXED SATELLITE': "Fixe par satellite",
+    'STANDARD FREQUENCY AND TIME SIGNAL': "Fréquences étalon et signaux horaires",
+    'STANDARD FREQUENCY AND TIME SIGNAL SATELLITE': "Fréquences étalon et signaux horaires par satellite",
+    'INTER SATELLITE': "Inter-satellites",
+    'METEOROLOGICAL SATELLITE': "Météorologie par satellite",
+    'MOBILE': "Mobile",
+    'AERONAUTICAL MOBILE': "Mobile aéronautique",
+    'AERONAUTICAL MOBILE SATELLITE': "Mobile aéronautique par satellite",
+    'MARITIME MOBILE': "Mobile maritime",
+    'MARITIME MOBILE SATELLITE': "Mobile maritime par satellite",
+    'MOBILE SATELLITE': "Mobile par satellite",
+    'MOBILE SATELLITE EXCEPT AERONAUTICAL MOBILE SATELLITE': "Mobile par satellite sauf mobile aéronautique par satellite",
+    'MOBILE SATELLITE EXCEPT MARITIME MOBILE SATELLITE': "Mobile par satellite sauf mobile maritime par satellite",
+    'MOBILE EXCEPT AERONAUTICAL MOBILE': "Mobile sauf mobile aéronautique",
+    'LAND MOBILE': "Mobile terrestre",
+    'LAND MOBILE SATELLITE': "Mobile terrestre par satellite",
+    'RADIO ASTRONOMY': "Radioastronomie",
+    'BROADCASTING': "Radiodiffusion",
+    'BROADCASTING SATELLITE': "Radiodiffusion par satellite",
+    'RADIOLOCATION': "Radiolocalisation",
+    'RADIOLOCATION SATELLITE': "Radiolocalisation par satellite",
+    'RADIONAVIGATION': "Radionavigation",
+    'AERONAUTICAL RADIONAVIGATION': "Radionavigation aéronautique",
+    'MARITIME RADIONAVIGATION': "Radionavigation maritime",
+    'RADIONAVIGATION SATELLITE': "Radionavigation par satellite",
+    'RADIODETERMINATION': "Radiorepérage",
+    'RADIODETERMINATION SATELLITE': "Radiorepérage par satellite",
+    'SPACE RESEARCH': "Recherche spatiale",
+}
+
+def french_sort_key(name):
+    # alphabetical order of the French names: the accents do not count
+    return unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower()
+
+# Position of each service in the French ordering
+SERVICE_RANKS = {service: rank for rank, service in enumerate(sorted(FRENCH_SERVICE_NAMES, key=lambda service: french_sort_key(FRENCH_SERVICE_NAMES[service])))}
+
+def service_key(service_name):
+    """Key of SERVICE_RANKS: capitals, hyphens as spaces, without the qualifiers in parentheses ((R), (space-to-Earth)...)."""
+    return " ".join(re.sub(r'\([^)]*\)', ' ', service_name).upper().replace('-', ' ').split())
+
+@functools.lru_cache(maxsize=None)
+def ordered_services(in_string):
+    """parse_services_and_footnotes of an allocation, the services in the order of the Radio Regulations.
+    Computed once per distinct allocation. If a service is not in the rank table (e.g. 'Not allocated'),
+    the order of the export is kept."""
+    services = parse_services_and_footnotes(in_string)
+    ranks = [SERVICE_RANKS.get(service_key(service['service'])) for service in services]
+    if None in ranks:
+        return tuple(services)
+    # primary services first, stable within the same service (e.g. MOBILE and MOBILE (DISTRESS AND CALLING))
+    order = sorted(range(len(services)), key=lambda i: (not services[i]['service'].isupper(), ranks[i]))
+    return tuple(services[i] for i in order)
+
+class GlyphWidthTable:
+    """Character widths relative to 'A' from a memory mapped glyph metrics file (helper/characterDict.py).
+    Covers every glyph of the font; characters without a glyph get the default width of the font."""
+
+    def __init__(self, widths, default_width):
+        self.widths = widths  # advance widths in 1/10000 em indexed by code point, 0: no glyph
+        self.default_width = default_width
+        self.reference_width = self.advance_width('A')
+
+    def advance_width(self, char):
+        code_point = ord(char)
+        if code_point < len(self.widths) and self.widths[code_point]:
+            return self.widths[code_point]
+        return self.default_width
+
+    def get(self, char, default=None):
+        return self.advance_width(char) / self.reference_width
+
+    def __contains__(self, char):
+        code_point = ord(char)
+        return code_point < len(self.widths) and self.widths[code_point] != 0
+
+    def string_width(self, text, font_size):
+        """Width of text in points."""
+        return sum(self.advance_width(char) for char in text) * font_size / 10000
+
+def load_glyph_metrics(metrics_filename):
+    """Memory maps a glyph metrics file and returns {font name: GlyphWidthTable}. See helper/characterDict.py."""
+    with open(metrics_filename, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, font_count = struct.unpack_from('<8sI', mapped, 0)
+    if magic != b'EFISGM01':
+        raise ValueError(f"{metrics_filename} is not a glyph metrics file")
+    tables = {}
+    for i in range(font_count):
+        name, default_width, _, offset, length = struct.unpack_from('<32sHHII', mapped, 12 + 44 * i)
+        widths = memoryview(mapped)[offset:offset + 2 * length]
+        if sys.byteorder == 'little':
+            widths = widths.cast('H')
+        else:
+            widths = struct.unpack_from(f'<{length}H', mapped, offset)
+        tables[name.rstrip(b'\0').decode('utf-8')] = GlyphWidthTable(widths, default_width)
+    return tables
+
+def make_charwidth_lookup_table(metrics_filename=None):
+    # Prefer the precompiled glyph metrics (all glyphs, no TTF parsing)
+    if metrics_filename and os.path.exists(metrics_filename):
+        glyph_metrics = load_glyph_metrics(metrics_filename)
+        if 'Arial' in glyph_metrics:
+            return glyph_metrics['Arial']
+        print(f"No metrics for Arial in {metrics_filename}, measuring the font.")
+
     # Register Arial font (Make sure you have 'arial.ttf' in the same directory or installed in your system)
     pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
 
@@ -205,15 +399,19 @@ def iterate_services(structured_services, relative_character_width, footnotesdic
     return services_string
 
 #this routine takes the string from the csv and formats it according to the
-#Radio Regulations. This needs to be extended to support reordering of the services 
-#according to the french ordering. Proposal: make a lookup table that stores the
-#services and the position in ordering according to the french way. Extract these numbers
-#according to the services at hand and to the reordering accordingly.
+#Radio Regulations. The services are reordered according to the french ordering
+#(SERVICE_RANKS), each distinct allocation is sorted only once (ordered_services).
 def wrap_service_data_info(in_string, footnotesdict, relative_character_width):
-    services_struct = parse_services_and_footnotes(in_string)
+    services_struct = ordered_services(in_string)
     #print("INString: "+in_string)
     return iterate_services(services_struct, relative_character_width, footnotesdict)
 
+def link_deliverable(deliverable, docdict):
+    urldoc=docdict.get(deliverable)
+    if urldoc is None: #no link rather than a link to "None"
+        return deliverable
+    return f'<link href="{urldoc}">{deliverable}</link>'
+
 def wrap_deliverables_info(in_string, docdict):
     test_str = in_string
     remaining_str = test_str
@@ -230,8 +428,7 @@ def wrap_deliverables_info(in_string, docdict):
             else:
                 line_char_count = line_char_count + 0.7
             if i == ',':  #outside a bracket replace a comma with a break; remove next (space)
-                urldoc=docdict.get(deliverable)
-                servicedata_info_out = servicedata_info_out + f'<link href="{urldoc}">{deliverable}</link>'
+                servicedata_info_out = servicedata_info_out + link_deliverable(deliverable, docdict)
                 servicedata_info_out = servicedata_info_out + ",<br/>"
                 deliverable=""
                 nc=",<br/>"
@@ -241,8 +438,7 @@ def wrap_deliverables_info(in_string, docdict):
                 deliverable = deliverable + nc
         else:
             kill_next_char = False
-    urldoc=docdict.get(deliverable)
-    servicedata_info_out = servicedata_info_out + f'<link href="{urldoc}">{deliverable}</link>'    
+    servicedata_info_out = servicedata_info_out + link_deliverable(deliverable, docdict)
     return servicedata_info_out
 
 def freqband_footnote_render(footnote_info, footnotesdict):
@@ -288,7 +484,209 @@ def populate_footnotes_dict(footnotesdict, dict_of_referenced_footnotes, footnot
                             dict_of_referenced_footnotes[footnote] = str(footnotesdict.get(footnote))
     return dict_of_referenced_footnotes
 
-def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
+def iter_eca_rows(data, drawn_text=None):
+    """Rows (index, row) of the ECA table or of an iterable of its batches. drawn_text: set that collects the
+    characters of every batch."""
+    for chunk in ([data] if isinstance(data, pd.DataFrame) else data):
+        if drawn_text is not None:
+            drawn_text.update("".join(str(value) for value in chunk.values.ravel()))
+        yield from chunk.iterrows()
+
+class AppendixBuilder:
+    """Streams the rows of the appendix chapters into one long table per chapter. The header row is repeated on
+    every page and the table is split by the layout engine at the real page boundaries."""
+
+    def __init__(self, elements, bookmarks, title_style, col_widths, style):
+        self.elements = elements
+        self.bookmarks = bookmarks
+        self.title_style = title_style
+        self.col_widths = col_widths
+        self.style = style
+        self.rows = []
+
+    def start_chapter(self, chapter, headers):
+        """Ends the current chapter and starts a new one on a new page."""
+        self.flush()
+        self.elements.append(PageBreak())
+        chapter_bookmark_name = f"chapter_{chapter.replace(' ', '_')}"
+        self.elements.append(Paragraph(chapter, self.title_style)) # add title
+        self.elements[-1]._bookmark = chapter_bookmark_name
+        self.bookmarks.append((chapter_bookmark_name, chapter, 0))
+        self.rows = [list(headers)]
+
+    def add_row(self, cells):
+        self.rows.append(cells)
+
+    def flush(self):
+        if len(self.rows) > 1:
+            self.elements.append(Table(self.rows, colWidths=self.col_widths, style=self.style, repeatRows=1))
+        self.rows = []
+
+# Auto layout: the column widths are chosen to minimize the estimated height of all tables.
+CELL_PADDING = 12  # left + right padding of a table cell
+CELL_LEADING = 9  # leading of common_style
+CELL_VERTICAL_PADDING = 6  # top + bottom padding of a table cell
+
+@functools.lru_cache(maxsize=None)
+def cached_string_width(text, font_name="Arial", font_size=8):
+    return pdfmetrics.stringWidth(text, font_name, font_size)
+
+def cell_text(markup):
+    """Plain text of paragraph markup, lines separated by newlines."""
+    # line breaks in the text are spaces for Paragraph, only <br/> breaks a line
+    return html.unescape(re.sub(r'<[^>]+>', '', re.sub(r'<br\s*/?>', '\n', re.sub(r'[\r\n]', ' ', str(markup)))))
+
+@functools.lru_cache(maxsize=None)
+def wrapped_line_count(text, width):
+    """Number of lines of text wrapped at the spaces into width points (Arial 8), like Paragraph does."""
+    if not text.strip():
+        return 0
+    space = cached_string_width(" ")
+    lines = 0
+    for line in text.split('\n'):
+        lines += 1
+        used = 0
+        for word in line.split():
+            word_width = cached_string_width(word)
+            if used and used + space + word_width <= width:
+                used += space + word_width
+                continue
+            if used:
+                lines += 1
+            # words longer than the column are split over several lines
+            lines += max(math.ceil(word_width / width) - 1, 0)
+            used = word_width - width * max(math.ceil(word_width / width) - 1, 0)
+    return lines
+
+def line_count_table(texts, widths):
+    """Lines of each text (rows) for each candidate width (columns), computed once per distinct text."""
+    distinct = {text: [wrapped_line_count(text, width - CELL_PADDING) for width in widths] for text in set(texts)}
+    return np.array([distinct[text] for text in texts], dtype=np.int32).reshape(len(texts), len(widths))
+
+def table_height(line_tables, indices, band_starts=None, band_minimum=None):
+    """Estimated height of the rows with the widths at indices of the line tables. With band_starts the rows are
+    grouped into band tables, which are at least band_minimum high (the spanned allocation cells)."""
+    lines = np.max([table[:, i] for table, i in zip(line_tables, indices)], axis=0)
+    rows = lines * CELL_LEADING + CELL_VERTICAL_PADDING
+    if band_starts is None:
+        return int(rows.sum())
+    return int(np.maximum(np.add.reduceat(rows, band_starts), band_minimum).sum())
+
+def optimize_widths(grids, widths, height):
+    """Coordinate descent: moves width from one column to another (the total stays the same) as long as
+    height(grid indices) decreases. grids are the candidate widths of each column, all with the same step."""
+    indices = [min(range(len(grid)), key=lambda i: abs(grid[i] - width)) for grid, width in zip(grids, widths)]
+    step = grids[0][1] - grids[0][0]
+    # widths raised to the minimum (a header would not fit) or rounded to the grid: the widest column compensates
+    widest = max(range(len(grids)), key=lambda column: grids[column][indices[column]])
+    indices[widest] -= (sum(grid[i] for grid, i in zip(grids, indices)) - sum(widths)) // step
+    start_height = best = height(indices)
+    move = 16
+    while move >= 1:
+        improved = False
+        for source in range(len(grids)):
+            for target in range(len(grids)):
+                if source == target or indices[source] < move or indices[target] + move >= len(grids[target]):
+                    continue
+                candidate = list(indices)
+                candidate[source] -= move
+                candidate[target] += move
+                candidate_height = height(candidate)
+                if candidate_height < best:
+                    best, indices, improved = candidate_height, candidate, True
+        if not improved:
+            move //= 2
+    return [grid[i] for grid, i in zip(grids, indices)], start_height, best
+
+def width_grids(minimums, total_width, step):
+    return [list(range(minimum, total_width - (sum(minimums) - minimum) + 1, step)) for minimum in minimums]
+
+# Table headings and default column widths of the ECA band tables and of the appendix tables
+ECA_TABLE_HEADERS = ["RR Region 1", "European Common Allocations", "Application", "CEPT Deliverables", "Standard", "Note"]
+# org: col_widths = [150, 150, 152, 92, 58, 180]  # Adjust based on content. Style
+ECA_COL_WIDTHS = [165, 165, 130, 84, 58, 180]  # Adjust based on content. Style
+# vst col_widths = [165, 165, 130, 85, 58, 180] # 
+FN_COL_WIDTHS = [100, 50+150+152+92+58+180]  # Adjust based on content
+# the headers of all appendix tables: footnotes, CEPT deliverables and standards, abbreviations
+APPENDIX_HEADERS = [["Footnote Number", "Footnote Content"], ["Document", "Description"], ["Abbreviation", "Description"]]
+
+def eca_auto_layout(data, width_lookup):
+    """--auto-layout: (ECA column widths, appendix column widths) for the ECA table data."""
+    return auto_column_widths(data, ECA_COL_WIDTHS, FN_COL_WIDTHS, ECA_TABLE_HEADERS, APPENDIX_HEADERS, width_lookup)
+
+def auto_column_widths(data, col_widths, FN_col_widths, table_headers, FN_headers, width_lookup, step=2):
+    """Column widths for the ECA band tables and the appendix tables (with the same total widths as the given ones)
+    that minimize the estimated table height. The allocation columns keep their width: their lines are wrapped by
+    render_service."""
+    footnote_start = data.index[data['Upper Frequency'] == "footnotetext"]
+    eca = data.loc[:footnote_start[0] - 1] if len(footnote_start) else data
+    appendix = data.loc[footnote_start[0]:] if len(footnote_start) else data.iloc[:0]
+    appendix = appendix[~appendix['Upper Frequency'].isin(["footnotetext", "title", "description"])]
+
+    # ECA table: Application, CEPT Deliverables, Standard and Note share the width left by the allocations
+    free_columns = [('Applications', False), ('ECC/ERC Harmonisation Measure', True), ('Standard', True), ('Notes', False)]
+    free_width = sum(col_widths[2:])
+    minimums = [step * math.ceil((cached_string_width(header) + CELL_PADDING) / step) for header in table_headers[2:]]
+    grids = width_grids(minimums, free_width, step)
+    line_tables = []
+    for (column, deliverables), grid in zip(free_columns, grids):
+        # wrap_deliverables_info puts every deliverable on its own line, the comma stays at its end
+        texts = [(",\n".join(split_deliverables(value)) if deliverables else cell_text(value)) for value in eca[column]]
+        line_tables.append(line_count_table(texts, grid))
+
+    # the spanned allocation cells: lines of the services wrapped at 28 'A' (render_service) and of the range footnotes
+    bands = (eca['Lower Frequency'].astype(str) + " - " + eca['Upper Frequency'].astype(str)).tolist()
+    band_starts = [i for i, band in enumerate(bands) if i == 0 or band != bands[i - 1]]
+    band_minimum = []
+    for start in band_starts:
+        row = eca.iloc[start]
+        lines = 0
+        for allocation, footnotes, width in (('RR Region 1 Allocation', 'RR Region 1 Footnotes', col_widths[0]),
+                                             ('European Common Allocation', 'ECA Footnotes', col_widths[1])):
+            services = parse_services_and_footnotes(str(row[allocation]).replace("(", " ("))
+            service_lines = sum(max(1, math.ceil(sum(width_lookup.get(char) or 1 for char in service['service'] + " (" + ", ".join(service['footnotes']) + ")") / 28))
+                                for service in services)
+            lines = max(lines, service_lines + wrapped_line_count(cell_text(row[footnotes]), width - CELL_PADDING))
+        band_minimum.append(lines * CELL_LEADING + CELL_VERTICAL_PADDING)
+    band_starts, band_minimum = np.array(band_starts), np.array(band_minimum)
+
+    widths, start_height, height = optimize_widths(grids, col_widths[2:],
+                                                   lambda indices: table_height(line_tables, indices, band_starts, band_minimum))
+    new_col_widths = col_widths[:2] + widths
+    print(f"Auto layout ECA tables: {col_widths} -> {new_col_widths}, estimated height {start_height} -> {height} pt")
+
+    # Appendix tables: footnote number, document or abbreviation and the content. The header is Helvetica 10.
+    FN_width = sum(FN_col_widths)
+    FN_minimums = [step * math.ceil((max(cached_string_width(header, "Helvetica", 10) for header in headers) + CELL_PADDING) / step)
+                   for headers in zip(*FN_headers)]
+    FN_grids = width_grids(FN_minimums, FN_width, step)
+    FN_line_tables = [line_count_table([cell_text(value) for value in appendix[column]], grid)
+                      for column, grid in zip(['Lower Frequency', 'Upper Frequency'], FN_grids)]
+    FN_widths, start_height, height = optimize_widths(FN_grids, FN_col_widths, lambda indices: table_height(FN_line_tables, indices))
+    print(f"Auto layout appendix tables: {FN_col_widths} -> {FN_widths}, estimated height {start_height} -> {height} pt")
+    return new_col_widths, FN_widths
+
+def checked_auto_layout(data, docdict, hamrstandsdict, footnotesdict, width_lookup):
+    """--auto-layout: the column widths of eca_auto_layout if the PDF has fewer pages with them than with the fixed
+    widths, otherwise the fixed widths. Both layouts are rendered in memory to count the pages."""
+    layouts = {"fixed": (list(ECA_COL_WIDTHS), list(FN_COL_WIDTHS)), "auto": eca_auto_layout(data, width_lookup)}
+    pages = {}
+    for name, layout in layouts.items():
+        # the trial renders neither print nor count unresolved references
+        trial_docdict = docdict.view() if isinstance(docdict, DocumentIndex) else docdict
+        trial_hamrstandsdict = hamrstandsdict.view() if isinstance(hamrstandsdict, DocumentIndex) else hamrstandsdict
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages[name] = generate_pdf(data, trial_docdict, trial_hamrstandsdict, footnotesdict, io.BytesIO(),
+                                       relative_character_width=width_lookup, auto_layout=True, column_widths=layout)
+    chosen = "auto" if pages["auto"] < pages["fixed"] else "fixed"
+    print(f"Auto layout: {pages['auto']} pages, fixed widths: {pages['fixed']} pages -> {chosen} widths")
+    return layouts[chosen]
+
+def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename, optimize_size=False, relative_character_width=None, reproducible=False, timestamp=None, auto_layout=False, column_widths=None):
+    """Writes the ECA table PDF to output_filename (a file name or a binary file) and returns the number of pages."""
+    # Time in the footer and creation date of the PDF
+    if timestamp is None:
+        timestamp = datetime.now()
 
     def draw_footer(canvas, doc):
         canvas.saveState()
@@ -307,7 +705,16 @@ def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
     
         # Draw the footer text at the bottom left of the page
         # canvas.drawRightString(doc.rightMargin, 1 * cm, footer_text_right)
-        canvas.drawString(doc.rightMargin, 1 * cm, footer_text_right)
+        if optimize_size:
+            # The text is the same on every page: store it once as a form and reference it.
+            if not canvas.hasForm("FooterGenerated"):
+                canvas.beginForm("FooterGenerated")
+                canvas.setFont("Arial", 9)
+                canvas.drawString(doc.rightMargin, 1 * cm, footer_text_right)
+                canvas.endForm()
+            canvas.doForm("FooterGenerated")
+        else:
+            canvas.drawString(doc.rightMargin, 1 * cm, footer_text_right)
 
 
         canvas.restoreState()
@@ -328,7 +735,9 @@ def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
                             leftMargin=1 * cm,
                             rightMargin=0.6 * cm,
                             topMargin=1 * cm,
-                            bottomMargin=1 * cm)
+                            bottomMargin=1 * cm,
+                            invariant=1 if reproducible else None,  # document ID from the content, no build time
+                            creation_time=timestamp if reproducible else None)
 
     elements = []
     
@@ -395,32 +804,86 @@ def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
         ('LINEBEFORE', (2, 0), (2, -1), 1, colors.white),  # Double line between service and application columns
     ])
 
-    InfoTableHeaderStyle=TableStyle([
+    # One style for all appendix tables: the first row is the header, it is repeated on every page
+    AppendixTableStyle=TableStyle([
                     ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align text to the top
+                    ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),  # Add grid to the entire table
+                    ('GRID', (0, 0), (-1, 0), 0.5, colors.black),  # Header grid
                     ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),  # Line under header
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),  # Add grid to the entire table
                     ('BACKGROUND', (0, 0), (-1, 0), colors.lavender),  # Header background vst lightgrey
-                    #('LINEBEFORE', (2, 0), (2, -1), 2, colors.black),  # Double line between service and application columns
-                    #('LINEBEFORE', (2, 0), (2, -1), 1, colors.white),  # Double line between service and application columns
                 ])
-    
-    InfoTableStyle=TableStyle([
+
+    # One style for all frequency band tables. The spans run to the last row (-1), whatever the table length.
+    ECABandTableStyle=TableStyle([
                         ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align text to the top
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),  # Add grid to the entire table
+                        ('SPAN', (0, 0), (0, -1)),  # Merge RR Region 1 cells
+                        ('SPAN', (1, 0), (1, -1)),  # Merge CEPT Allocation cells
+                        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),  # Add grid to the entire table
+                        ('LINEBEFORE', (2, 0), (2, -1), 2, colors.black),  # Double line between service and application columns
+                        ('LINEBEFORE', (2, 0), (2, -1), 1, colors.white),  # Double line between service and application columns
                     ])
+
+    # The header tables repeat on every page. In size optimized mode they are drawn once into a form and referenced.
+    def header_table(headers, widths, style):
+        table = Table([headers], colWidths=widths, style=style)
+        if not optimize_size:
+            return table
+        return SharedFormFlowable("Header_" + re.sub(r'\W', '_', "_".join(headers)), table)
+
     # Table headings
-    table_headers = ["RR Region 1", "European Common Allocations", "Application", "CEPT Deliverables", "Standard", "Note"]
-    # org: col_widths = [150, 150, 152, 92, 58, 180]  # Adjust based on content. Style
-    col_widths = [165, 165, 130, 84, 58, 180]  # Adjust based on content. Style
-    # vst col_widths = [165, 165, 130, 85, 58, 180] # 
+    table_headers = list(ECA_TABLE_HEADERS)
+    col_widths = list(ECA_COL_WIDTHS)
     
     FN_table_headers = ["Footnote Number", "Footnote Content"]
-    FN_col_widths = [100, 50+150+152+92+58+180]  # Adjust based on content
+    FN_col_widths = list(FN_COL_WIDTHS)
+
+    if relative_character_width is None:
+        relative_character_width = make_charwidth_lookup_table()
+
+    # data is the ECA table or an iterable of its batches (read_eca_chunks). The story keeps every table until
+    # doc.build, so the batches do not lower the peak memory of the build.
+    streamed = not isinstance(data, pd.DataFrame)
+    drawn_text = set()  # characters of the streamed batches, for the font subset check of optimize_size
+    if auto_layout and streamed and column_widths is None:
+        raise ValueError("auto_layout needs the whole ECA table, not an iterable of batches")
+
+    if auto_layout:
+        col_widths, FN_col_widths = column_widths or checked_auto_layout(data, docdict, hamrstandsdict, footnotesdict, relative_character_width)
 
     current_band = None
     table_data = []  # Initialize the table_data list before the loop
-    lines_used = 0  # Track the number of lines used on the current page
-    max_lines_per_page = 44  # Adjust based on the content and font size
+
+    # The band tables are placed by their measured height (with the final column widths): a band that does not
+    # fit on the current page starts a new page with the table header.
+    frame_width, frame_height = doc.width - 12, doc.height - 12  # the frame has a padding of 6 pt on each side
+    height_used = 0
+
+    def measured_height(flowable):
+        # the frame does not let a negative space after (band_style) overlap the next flowable
+        return flowable.wrap(frame_width, frame_height)[1] + flowable.getSpaceBefore() + max(flowable.getSpaceAfter(), 0)
+
+    def add_band_table(band, table_data):
+        nonlocal height_used
+        paragraph = Paragraph(band, band_style)
+        table = Table(table_data, colWidths=col_widths, style=ECABandTableStyle)
+        band_height = measured_height(paragraph) + measured_height(table)
+        if height_used + band_height > frame_height:
+            elements.append(PageBreak())
+            elements.append(header_table(table_headers, col_widths, ECATableHeaderStyle))
+            elements.append(Spacer(1, 12))
+            height_used = measured_height(elements[-2]) + 12
+
+        # Add a bookmark for the current frequency band
+        bookmark_name = f"{chapter_bookmark_name}_band_{band.replace(' ', '_')}"
+        elements.append(paragraph)
+        elements[-1]._bookmark = bookmark_name
+        bookmarks.append((bookmark_name, band, 1))
+        elements.append(table)
+        height_used += band_height
+
+        if height_used + 12 <= frame_height:
+            elements.append(Spacer(1, 12))  # Add space after each frequency band table
+            height_used += 12
     
     #Title
     chapter="ECA Table"
@@ -432,25 +895,23 @@ def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
     
 
     # draw the initial first table header
-    table_data = [table_headers]
-    elements.append(Table(table_data, colWidths=col_widths, style=ECATableHeaderStyle))
+    elements.append(header_table(table_headers, col_widths, ECATableHeaderStyle))
     elements.append(Spacer(1, 12))  # Add space after each frequency band table
-    lines_used = 4  # Track the number of lines used on the current page
+    height_used = measured_height(elements[-3]) + measured_height(elements[-2]) + 12
 
     table_data = []  # Initialize the table_data list before the loop
     first_line = True
-    comas_for_table = 0
-    service_hight = 0
     
     inECAtable = True
     inECAFootnoteTable = False
     docType = "ECATable"
 
-    relative_character_width = make_charwidth_lookup_table()
+    # The appendix chapters: one long table per chapter, its header row is repeated on every page
+    appendix = AppendixBuilder(elements, bookmarks, title_style, FN_col_widths, AppendixTableStyle)
 
     dict_of_referenced_footnotes = {}
 
-    for index, row in data.iterrows():
+    for index, row in iter_eca_rows(data, drawn_text if optimize_size and streamed else None):
         
         #Footnote Part of csv reached
         if (row['Upper Frequency']=="footnotetext"):
@@ -466,40 +927,7 @@ def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
                 first_line = True
                 # If table_data is not empty, create and add the table to elements
                 if table_data:
-                    # Estimate the number of lines the current table will use
-                    tt_len = len(table_data)                
-                    lines_for_table = max(service_hight, comas_for_table * 1 + tt_len) + 3.7  # Adding 2 for the band title and spacer
-                    comas_for_table = 0
-                    # Check if adding this table will exceed the max lines per page
-                    if lines_used + lines_for_table > max_lines_per_page:
-                        elements.append(PageBreak())
-                        table_head_data = [table_headers]
-                        elements.append(Table(table_head_data, colWidths=col_widths, style=ECATableHeaderStyle))
-
-                        elements.append(Spacer(1, 12))  # Add space after each frequency band table
-                        lines_used = 2  # Track the number of lines used on the current page
-        
-                    # Add the table and update lines used
-                    # Add a bookmark for the current frequency band
-                    bookmark_name = f"{chapter_bookmark_name}_band_{current_band.replace(' ', '_')}"
-                    paragraph = Paragraph(current_band, band_style)
-                    elements.append(paragraph)
-                    elements[-1]._bookmark = bookmark_name
-                    bookmarks.append((bookmark_name, current_band, 1))
-                    
-                    elements.append(Table(table_data, colWidths=col_widths, style=TableStyle([
-                        ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align text to the top
-                        ('SPAN', (0, 0), (0, len(table_data) - 1)),  # Merge RR Region 1 cells
-                        ('SPAN', (1, 0), (1, len(table_data) - 1)),  # Merge CEPT Allocation cells
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),  # Add grid to the entire table
-                        ('LINEBEFORE', (2, 0), (2, -1), 2, colors.black),  # Double line between service and application columns
-                        ('LINEBEFORE', (2, 0), (2, -1), 1, colors.white),  # Double line between service and application columns
-                    ])))
-
-                    lines_used += lines_for_table
-                    
-                    if lines_used < 0.9*max_lines_per_page:
-                        elements.append(Spacer(1, 12))  # Add space after each frequency band table
+                    add_band_table(current_band, table_data)
 
 
                 # Start a new table for the new frequency band
@@ -540,91 +968,53 @@ def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
                 table_first_line = [service_info, cept_info, app_info, cept_doc, standard, notes]
                 table_data = [table_first_line]  # Reset the table data with the headers
                 #table_data.append([service_info, cept_info, app_info, cept_doc, standard, notes])
-                service_hight = 0.85*max(len(service_info.text) // 30, len(cept_info.text) // 30, service_info.text.count('<br/>'), cept_info.text.count('<br/>'))
                 first_line = False
             else:
                 table_data.append([service_info, cept_info, app_info, cept_doc, standard, notes])
-            commas_for_row = max(standard.text.count(','), cept_doc.text.count(','), len(notes.text) // 40) # estimate the hight of the line. Check the number of comas, cehck the length of the note.
-            comas_for_table = comas_for_table+commas_for_row
         elif (inECAtable == False and inECAFootnoteTable == False):
             inECAFootnoteTable = True
             print("Dict of Referenced Footnotes")
             print(dict_of_referenced_footnotes)
             # Add the last table for the remaining data
             if table_data:
-                # Estimate the number of lines the last table will use
-                tt_len = len(table_data)                
-                lines_for_table = max(service_hight, comas_for_table * 1.0 + tt_len) + 3  # Adding 2 for the band title and spacer
-                comas_for_table = 0
-                # Check if adding this table will exceed the max lines per page
-                if lines_used + lines_for_table > max_lines_per_page:
-                    elements.append(PageBreak())
-                    table_head_data = [table_headers]
-                    elements.append(Table(table_head_data, colWidths=col_widths, style=ECATableHeaderStyle))
-                    elements.append(Spacer(1, 12))  # Add space after each frequency band table
-                    lines_used = 2  # Track the number of lines used on the current page
-            
-                # Add the table and update lines used
-                bookmark_name = f"{chapter_bookmark_name}_band_{current_band.replace(' ', '_')}"
-                paragraph = Paragraph(current_band, band_style)
-                elements.append(paragraph)
-                elements[-1]._bookmark = bookmark_name
-                bookmarks.append((bookmark_name, current_band, 1))
-                    
-                
-                #elements.append(Paragraph(current_band, band_style))
-                elements.append(Table(table_data, colWidths=col_widths, style=TableStyle([
-                        ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align text to the top
-                        ('SPAN', (0, 0), (0, len(table_data) - 1)),  # Merge RR Region 1 cells
-                        ('SPAN', (1, 0), (1, len(table_data) - 1)),  # Merge CEPT Allocation cells
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),  # Add grid to the entire table
-                        ('LINEBEFORE', (2, 0), (2, -1), 2, colors.black),  # Double line between service and application columns
-                        ('LINEBEFORE', (2, 0), (2, -1), 1, colors.white),  # Double line between service and application columns
-                    ])))
+                add_band_table(current_band, table_data)
 
                 #new page: now the footnotes start:
-                elements.append(PageBreak())
-                # draw the initial first table header
-
-                chapter="ECA Footnotes"
-                chapter_bookmark_name = f"chapter_{chapter.replace(' ', '_')}"
-                paragraph = Paragraph(chapter, title_style)
-                elements.append(paragraph) # add title
-                elements[-1]._bookmark = chapter_bookmark_name
-                bookmarks.append((chapter_bookmark_name, chapter, 0))
-
-                table_data = [FN_table_headers]
-                elements.append(Table(table_data, colWidths=FN_col_widths, style=InfoTableHeaderStyle))
-                elements.append(Spacer(1, 12))  # Add space after each frequency band table
-                lines_used = 4  # Track the number of lines used on the current page
-                first_line = True
+                appendix.start_chapter("ECA Footnotes", FN_table_headers)
 
         elif (inECAFootnoteTable):
-                if (row['Upper Frequency']=="title" and docType=="ETSI"):
+                # A marker row starts the next appendix chapter
+                marker = row['Upper Frequency']
+                if (marker=="title" and docType=="ETSI"):
                     print("ETSI what start")
                     docType = "ETSIwhat"
                     FN_table_headers = ["Document", "Description"]
-                    lines_used = 100 #trigger a new page. 
-                if (row['Upper Frequency']=="title" and docType=="CEPT"):
+                    appendix.start_chapter("European Standards for Receive-Only Equipment", FN_table_headers)
+                    continue
+                elif (marker=="title" and docType=="CEPT"):
                     print("ETSI start")
                     docType = "ETSI"
                     FN_table_headers = ["Document", "Description"]
-                    lines_used = 100 #trigger a new page. 
-                if (row['Upper Frequency']=="title" and docType=="RR"):
+                    appendix.start_chapter("European Standards", FN_table_headers)
+                    continue
+                elif (marker=="title" and docType=="RR"):
                     print("CEPT start")
                     docType = "CEPT"
                     FN_table_headers = ["Document", "Description"]
-                    lines_used = 100 #trigger a new page.
-                if (row['Upper Frequency']=="footnotetext"):  # ECA footnotes
+                    appendix.start_chapter("CEPT Deliverables", FN_table_headers)
+                    continue
+                elif (marker=="footnotetext"):  # ECA footnotes
                     inECAtable = False
                     print("RR footnotes start")
                     docType = "RR"
-                    lines_used = 100 #trigger a new page.
-                if (row['Upper Frequency']=="description"):
+                    appendix.start_chapter("Radio Regulations Footnotes", FN_table_headers)
+                    continue
+                elif (marker=="description"):
                     print("abbreviation start")
                     FN_table_headers = ["Abbreviation", "Description"]
                     docType = "Abbreviations"
-                    lines_used = 100 #trigger a new page.
+                    appendix.start_chapter("Abbreviations", FN_table_headers)
+                    continue
                 # <a name='LTE'/>LTE
                 #foot_note_number = "<a name='" +row['Lower Frequency']+"'/>"+ row['Lower Frequency']
                 foot_note_number = row['Lower Frequency']
@@ -652,66 +1042,130 @@ def generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_filename):
                         foot_note_number = f'<link href="{urldoc}">{foot_note_number}</link>'
 
                 if foot_note_number != "":
-                    foot_note_number_par = Paragraph(f"{foot_note_number}", common_style) #attach the footnotes
-                    foot_note_content_par = Paragraph(f"{foot_note_content}", common_style) #attach the footnotes
-                
-                    if lines_used < 100: #ignore line.
-                        if first_line:
-                            table_first_line = [foot_note_number_par, foot_note_content_par]
-                            table_data = [table_first_line]  # Reset the table data with the headers
-                            #table_data.append([service_info, cept_info, app_info, cept_doc, standard, notes])
-                            first_line = False
-                        else:
-                            table_data.append([foot_note_number_par, foot_note_content_par])
-                    
-                        footnote_height = max(len(foot_note_content_par.text) // 190,  foot_note_content_par.text.count('<br/>'))
-                        lines_used = lines_used + footnote_height + 1.4
-                        #print(lines_used)
-
-                if (lines_used  > max_lines_per_page):
-
-                    elements.append(Table(table_data, colWidths=FN_col_widths, style=InfoTableStyle))
-                    #add the table and make a new page.
-                    elements.append(PageBreak())
-
-                    if lines_used == 100: #insert new title
-                        lines_used = 2
-                        if docType=="RR":
-                            chapter = "Radio Regulations Footnotes"
-                            paragraph = Paragraph("Radio Regulations Footnotes", title_style)
-                        elif docType=="CEPT":
-                            chapter = "CEPT Deliverables"
-                            paragraph = Paragraph("CEPT Deliverables", title_style)
-                        elif docType=="ETSI":
-                            chapter = "European Standards"
-                            paragraph = Paragraph("European Standards", title_style)
-                        elif docType=="ETSIwhat":
-                            chapter = "European Standards for Receive-Only Equipment"
-                            paragraph = Paragraph("European Standards for Receive-Only Equipment", title_style)
-                        elif docType=="Abbreviations":
-                            chapter = "Abbreviations"
-                            paragraph = Paragraph("Abbreviations", title_style)
-                        chapter_bookmark_name = f"chapter_{chapter.replace(' ', '_')}"
-                        paragraph = Paragraph(chapter, title_style)
-                        elements.append(paragraph) # add title
-                        elements[-1]._bookmark = chapter_bookmark_name
-                        bookmarks.append((chapter_bookmark_name, chapter, 0))
-                    else:
-                        lines_used = 0
+                    appendix.add_row([Paragraph(f"{foot_note_number}", common_style), #attach the footnotes
+                                      Paragraph(f"{foot_note_content}", common_style)])
 
-                    table_data = [FN_table_headers]
-                    elements.append(Table(table_data, colWidths=FN_col_widths, style=InfoTableHeaderStyle))
-                    elements.append(Spacer(1, 12))  # Add space after each frequency band table
-                    lines_used = lines_used + 2  # Track the number of lines used on the current page
-                    first_line = True
-    
     #Append the left-over data
-    elements.append(Table(table_data, colWidths=FN_col_widths, style=InfoTableStyle))
+    appendix.flush()
     
     # Build PDF
     doc.build(elements, onFirstPage=my_fi_page, onLaterPages=my_on_page)
 
-def process_csv(csv_filename):
+    if optimize_size:
+        # every character that can end up in the document: the data, the fixed texts and the footer
+        drawn_text = "".join(drawn_text) if streamed else "".join(str(value) for value in data.values.ravel())
+        drawn_text += "".join(table_headers) + "".join(FN_table_headers) + "Footnote NumberContentDocumentDescriptionAbbreviation"
+        drawn_text += "ECA TableECA FootnotesRadio Regulations FootnotesCEPT DeliverablesEuropean Standards for Receive-Only Equipment"
+        drawn_text += "Page 0123456789Report generated:.\xa0"
+        optimize_pdf_output(output_filename, drawn_text, deterministic=reproducible)
+    return doc.page
+
+def inflate_pdf_stream(body):
+    """Returns the decompressed stream of a PDF object body, or b'' if it has no deflated stream."""
+    match = re.search(rb'stream\r?\n(.*)endstream', body, re.S)
+    if not match:
+        return b''
+    try:
+        return zlib.decompressobj().decompress(match.group(1))
+    except zlib.error:
+        return b''
+
+def report_pdf_components(pdf_filename):
+    """Returns the bytes and the number of objects per component of a PDF written by ReportLab."""
+    with open(pdf_filename, 'rb') as file:
+        content = file.read()
+
+    components = {}
+    for body in re.findall(rb'\n\d+ 0 obj\r?\n(.*?)endobj', content, re.S):
+        if b'/Subtype /Link' in body:
+            component = "Link annotations (URL)" if b'/URI' in body else "Link annotations (internal)"
+        elif b'/Subtype /Form' in body:
+            component = "Shared forms"
+        elif b'/Length1' in body:
+            component = "Font programs"
+        elif b'/Type /Font' in body or b'/Type /FontDescriptor' in body:
+            component = "Font dictionaries"
+        elif b'stream' in body:
+            component = "Font dictionaries" if b'begincmap' in inflate_pdf_stream(body) else "Page content streams"
+        elif b'/Type /Page' in body and b'/Type /Pages' not in body:
+            component = "Page objects"
+        elif b'/Title' in body or b'/Type /Outlines' in body:
+            component = "Bookmarks"
+        else:
+            component = "Other"
+        size, count = components.get(component, (0, 0))
+        components[component] = (size + len(body), count + 1)
+    return components
+
+def verify_font_subset(pdf_filename, drawn_text):
+    """Returns the characters embedded in the TrueType subsets and those not found in drawn_text."""
+    with open(pdf_filename, 'rb') as file:
+        content = file.read()
+
+    embedded = set()
+    for body in re.findall(rb'\n\d+ 0 obj\r?\n(.*?)endobj', content, re.S):
+        cmap = inflate_pdf_stream(body)
+        if b'begincmap' in cmap:
+            embedded.update(chr(int(code, 16)) for code in re.findall(rb'<[0-9A-F]{2}> <([0-9A-F]{4,})>', cmap))
+    # ReportLab fills the first subset with code 0 and spaces
+    unused = embedded - set(drawn_text) - {'\x00', ' '}
+    return embedded, unused
+
+def optimize_pdf_output(pdf_filename, drawn_text, deterministic=False):
+    size_before = os.path.getsize(pdf_filename)
+    print(f"Size report for {pdf_filename}:")
+    for component, (size, count) in sorted(report_pdf_components(pdf_filename).items(), key=lambda item: -item[1][0]):
+        print(f"  {component:<30} {size:>10} bytes  {count:>6} objects")
+
+    # ReportLab keeps printable ASCII readable in the first subset. This costs a few glyphs but keeps the
+    # content streams smaller than escaped character codes would.
+    embedded, unused = verify_font_subset(pdf_filename, drawn_text)
+    unused_ascii = {char for char in unused if 32 <= ord(char) < 128}
+    print(f"Font subset: {len(embedded)} glyphs embedded, {len(unused_ascii)} of the readable ASCII block not used: {''.join(sorted(unused_ascii))}")
+    if unused - unused_ascii:
+        print(f"WARNING: font subset is not minimal, unused glyphs: {''.join(sorted(unused - unused_ascii))}")
+
+    # Pack the many small objects (mostly link annotations) into compressed object streams
+    if pikepdf is None:
+        print("pikepdf is not installed: object streams are not compressed.")
+    else:
+        with pikepdf.open(pdf_filename, allow_overwriting_input=True) as pdf:
+            pdf.save(pdf_filename, object_stream_mode=pikepdf.ObjectStreamMode.generate, compress_streams=True, deterministic_id=deterministic)
+    print(f"  {'Total':<30} {size_before:>10} bytes, written {os.path.getsize(pdf_filename)} bytes")
+
+def read_eca_chunks(csv_filename, chunk_rows):
+    """Reads the ECA table export in batches of chunk_rows rows and yields each batch as soon as it is read.
+    The batches have the script column names, no NaN and categorical repetitive columns. The row index runs on
+    over the batches."""
+    with pd.read_csv(csv_filename, sep=';', quotechar='"', dtype=str, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            if len(chunk.columns) != len(ECA_COLUMNS):
+                raise ValueError(f"{csv_filename} has {len(chunk.columns)} columns, expected {len(ECA_COLUMNS)}: {list(chunk.columns)}")
+            chunk.columns = ECA_COLUMNS
+            chunk.fillna("  ", inplace=True)
+            for column in ECA_CATEGORICAL_COLUMNS:
+                chunk[column] = chunk[column].astype('category')
+            yield chunk
+
+def combine_eca_chunks(chunks):
+    """Concatenates the batches of read_eca_chunks. The categories are merged, so the columns stay categorical."""
+    chunks = list(chunks)
+    if len(chunks) <= 1:
+        return chunks[0] if chunks else pd.DataFrame(columns=ECA_COLUMNS)
+    columns = {}
+    for column in ECA_COLUMNS:
+        if column in ECA_CATEGORICAL_COLUMNS:
+            columns[column] = union_categoricals([chunk[column] for chunk in chunks])
+        else:
+            columns[column] = np.concatenate([chunk[column].to_numpy() for chunk in chunks])
+    index = pd.Index(np.concatenate([chunk.index.to_numpy() for chunk in chunks]))
+    return pd.DataFrame(columns, index=index)
+
+def process_csv(csv_filename, chunk_rows=None):
+    # Large exports (archives of several years): read in batches, the repetitive columns become categoricals
+    if chunk_rows:
+        return combine_eca_chunks(read_eca_chunks(csv_filename, chunk_rows))
+
     # Read the CSV file without any changes to the row order
     df = pd.read_csv(csv_filename, sep=';', quotechar='"')
 
@@ -720,13 +1174,9 @@ def process_csv(csv_filename):
 
     # Renaming columns for easier access
     # TODO: This needs to be adapted in case the csv format is changed (swap Standard and Applications)
-    df.columns = [
-        'Lower Frequency', 'Upper Frequency', 
-        'RR Region 1 Allocation', 'RR Region 1 Footnotes', 
-        'European Common Allocation', 'ECA Footnotes', 
-        'ECC/ERC Harmonisation Measure', 'Applications', 
-        'Standard', 'Notes'
-    ]
+    if len(df.columns) != len(ECA_COLUMNS):
+        raise ValueError(f"{csv_filename} has {len(df.columns)} columns, expected {len(ECA_COLUMNS)}: {list(df.columns)}")
+    df.columns = ECA_COLUMNS
 
     return df
 # Function to download the file
@@ -777,18 +1227,114 @@ def create_hamrstands_dict(input_db_csv_file):
 
     return decision_dict
 
+def normalize_document_id(doc_id):
+    """Returns the lookup key of a document identifier, independent of case, whitespace and notation.
+
+    ERC/REC/(01)01 and ERC/REC 01-01 both become ERC/REC/01-01, ECC Report 001 becomes ECC REPORT 1
+    and ETSI EN 300 328 V2.2.2 becomes EN 300 328."""
+    key = re.sub(r'<br\s*/?>', ' ', str(doc_id), flags=re.IGNORECASE)
+    key = " ".join(key.replace('\ufeff', '').replace('\xa0', ' ').upper().split())
+
+    # ECC/DEC/(04)10, ECC/REC/(11)09, ERC/REC 70-03, ERC/REC/(01)01, ...
+    match = re.fullmatch(r'(ECC|ERC) ?/ ?(DEC|REC) ?/? ?\(? ?(\d{2}) ?\)? ?[-/]? ?(\d{2})', key)
+    if match:
+        return f"{match[1]}/{match[2]}/{match[3]}-{match[4]}"
+
+    # ECC Report 001, ERC Report 25, CEPT Report 1, ...
+    match = re.fullmatch(r'(ECC|ERC|CEPT) (?:REPORT|REP) ?0*(\d+)(.*)', key)
+    if match:
+        return f"{match[1]} REPORT {match[2]}{match[3]}"
+
+    # EN 300 328, EN300328, ETSI EN 301 908-1 V15.1.1, ... (the version is not part of the key)
+    match = re.fullmatch(r'(?:ETSI )?EN ?(\d{3}) ?(\d{3})((?: ?- ?\d+)*)(?: ?V?\d+(?:\.\d+)+)?', key)
+    if match:
+        return f"EN {match[1]} {match[2]}{match[3].replace(' ', '')}"
+
+    return key
+
+class DocumentIndex:
+    """URL lookup by normalized document identifier. Remembers the identifiers which could not be resolved."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.unresolved = {}
+
+    def view(self):
+        """Index on the same entries with its own unresolved counts, e.g. one per build."""
+        return DocumentIndex(self.entries)
+
+    def get(self, doc_id, default=None):
+        url = self.entries.get(normalize_document_id(doc_id))
+        if url is None:
+            if str(doc_id).strip() != "":
+                self.unresolved[doc_id] = self.unresolved.get(doc_id, 0) + 1
+            return default
+        return url
+
+    def report_unresolved(self, name):
+        report_unresolved(name, self.unresolved)
+
+def report_unresolved(name, unresolved):
+    if not unresolved:
+        print(f"{name}: all references resolved.")
+        return
+    print(f"{name}: {len(unresolved)} unresolved references")
+    for doc_id, count in sorted(unresolved.items()):
+        print(f"  {doc_id!r} ({count}x)")
+
+# Version of the stored document indexes: increase it when their format changes
+DOCUMENT_INDEX_FORMAT = 1
+
+def document_index_version(create_dict):
+    """Format and hash of the code that makes the entries (the normalizer and the CSV reader): a stored index
+    is rebuilt when this code has changed."""
+    try:
+        code = inspect.getsource(normalize_document_id) + inspect.getsource(create_dict)
+    except (OSError, TypeError):
+        code = repr((normalize_document_id.__code__.co_code, create_dict.__code__.co_code))
+    return f"{DOCUMENT_INDEX_FORMAT}:{hashlib.sha256(code.encode('utf-8')).hexdigest()[:16]}"
+
+def load_document_index(input_db_csv_file, create_dict):
+    """Returns the DocumentIndex of a CSV export. The normalized entries are stored next to the CSV file together
+    with the hash of the CSV file and the version of the normalizer. They are only rebuilt (with create_dict) when
+    the CSV file or the normalizer has changed."""
+    with open(input_db_csv_file, 'rb') as file:
+        source_hash = hashlib.sha256(file.read()).hexdigest()
+    version = document_index_version(create_dict)
+
+    index_file = input_db_csv_file + '.index.json'
+    try:
+        with open(index_file, encoding='utf-8') as file:
+            stored = json.load(file)
+        if stored.get('source_sha256') == source_hash and stored.get('version') == version:
+            return DocumentIndex(stored['entries'])
+    except (OSError, ValueError):
+        pass
+
+    entries = {}
+    for doc_id, url in create_dict(input_db_csv_file).items():
+        entries.setdefault(normalize_document_id(doc_id), url)
+    try:
+        with open(index_file, 'w', encoding='utf-8') as file:
+            json.dump({'source_sha256': source_hash, 'version': version, 'entries': entries}, file, indent=1)
+    except OSError as e:
+        print(f"Could not store the index {index_file}. Error: {e}")
+    return DocumentIndex(entries)
+
 def create_footnotes_dict(input_db_csv_file):
     footnotes_dict = {}
 
     # Open the CSV file
     with open(input_db_csv_file, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile, delimiter=';')  # Read CSV with headers
-        #print(reader)
+        reader = csv.reader(csvfile, delimiter=';')
+        next(reader, None)  # skip the header (by position: the first column name may carry a BOM or not)
         infootnotesection = False
         for row in reader:
             #print(row)
-            footnote_id = row['\ufeff"Lower Frequency"']
-            footnote_txt = row['Upper Frequency']        
+            if len(row) < 2:
+                continue
+            footnote_id = row[0]
+            footnote_txt = row[1]
             if infootnotesection == False:
                 if (footnote_txt=="footnotetext"):  # ECA footnotes
                     infootnotesection = True
@@ -799,6 +1345,533 @@ def create_footnotes_dict(input_db_csv_file):
                     footnotes_dict[footnote_id] = footnote_txt
     return footnotes_dict
 
+def resolve_input(csv_file, latest_file):
+    # LATEST inputs are downloaded to the current directory
+    return os.path.join('.', latest_file) if csv_file == 'LATEST' else csv_file
+
+def load_inputs(input_db_csv, input_harmstand_csv, input_csv, docdb_url=DOCDB_URL, harmstand_url=HARMSTAND_URL, eca_url=ECA_URL, chunk_rows=None):
+    """Downloads the LATEST inputs concurrently and parses each one as soon as its download is complete.
+    Returns docdict, hamrstandsdict, footnotesdict and the ECA data (read in batches of chunk_rows rows if given)."""
+
+    def parse_eca(csv_file):
+        return create_footnotes_dict(csv_file), process_csv(csv_file, chunk_rows)
+
+    def fetch_and_parse(name, csv_file, latest_file, url, parse):
+        start = time.perf_counter()
+        if csv_file == 'LATEST':
+            csv_file = resolve_input(csv_file, latest_file)
+            download_file(url, csv_file)
+        downloaded = time.perf_counter()
+        result = parse(csv_file)
+        print(f"{name}: {csv_file} fetched in {downloaded - start:.1f} s, parsed in {time.perf_counter() - downloaded:.1f} s")
+        return result
+
+    print(f"Read Document Database: {input_db_csv}")
+    print(f"Read Document Database: {input_harmstand_csv}")
+    print(f"Processing input file: {input_csv}")
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        docdb = executor.submit(fetch_and_parse, "CEPT documents", input_db_csv, 'LATEST_docDB.csv', docdb_url,
+                                lambda csv_file: load_document_index(csv_file, create_docdb_dict))
+        harmstand = executor.submit(fetch_and_parse, "Harmonised standards", input_harmstand_csv, 'LATEST_hEN.csv', harmstand_url,
+                                    lambda csv_file: load_document_index(csv_file, create_hamrstands_dict))
+        eca = executor.submit(fetch_and_parse, "ECA table", input_csv, 'LATEST_ECA.csv', eca_url, parse_eca)
+        footnotesdict, data = eca.result()
+        return docdb.result(), harmstand.result(), footnotesdict, data
+
+FREQUENCY_UNITS = {'Hz': 1, 'kHz': 1e3, 'MHz': 1e6, 'GHz': 1e9, 'THz': 1e12}
+
+def check_schema(csv_filename):
+    """Returns the issues of the header line of the ECA csv file."""
+    with open(csv_filename, newline='', encoding='utf-8') as csvfile:
+        header = next(csv.reader(csvfile, delimiter=';'), [])
+    header = [name.lstrip('\ufeff').strip('"') for name in header]
+    expected = [name for name, _ in ECA_CSV_COLUMNS]
+    if len(header) != len(expected):
+        return [{'check': 'schema', 'record': 0, 'value': f"{len(header)} columns, expected {len(expected)}: {header}"}]
+    return [{'check': 'schema', 'record': 0, 'value': f"column {i+1} is '{name}', expected '{expected_name}'"}
+            for i, (name, expected_name) in enumerate(zip(header, expected)) if name != expected_name]
+
+def validate_export(data, footnotesdict, docdict, hamrstandsdict, width_lookup):
+    """Checks the parsed ECA export with vectorized operations. Returns the lists of errors and warnings,
+    each issue is a dict with the check, the record number (1 = first data record) and the value."""
+    errors = []
+    warnings = []
+
+    def issues(check, mask, values):
+        return [{'check': check, 'record': int(index) + 1, 'value': str(value)} for index, value in values[mask].items()]
+
+    # The ECA table ends where the footnotes start
+    footnote_start = data.index[data['Upper Frequency'] == "footnotetext"]
+    eca = data.loc[:footnote_start[0] - 1] if len(footnote_start) else data
+    if not len(footnote_start):
+        errors.append({'check': 'schema', 'record': 0, 'value': "no footnotetext row: the footnote section is missing"})
+
+    # Band ordering and overlaps: one entry per run of rows of the same band, so that a band that comes back
+    # later is reported as repeated and compared with its neighbours
+    bands = eca[['Lower Frequency', 'Upper Frequency']]
+    bands = bands[(bands['Lower Frequency'] != bands['Lower Frequency'].shift()) | (bands['Upper Frequency'] != bands['Upper Frequency'].shift())]
+    frequencies = {}
+    for column in ('Lower Frequency', 'Upper Frequency'):
+        parts = bands[column].str.extract(r'^\s*([\d.]+)\s*(Hz|kHz|MHz|GHz|THz)\s*$')
+        frequencies[column] = pd.to_numeric(parts[0], errors='coerce') * parts[1].map(FREQUENCY_UNITS)
+        errors += issues('band_frequency', frequencies[column].isna(), bands[column])
+    lower = frequencies['Lower Frequency']
+    upper = frequencies['Upper Frequency']
+    band_names = bands['Lower Frequency'] + " - " + bands['Upper Frequency']
+    errors += issues('band_order', lower >= upper, band_names)
+    previous_upper = upper.shift()
+    errors += issues('band_overlap', lower < previous_upper, band_names)
+    warnings += issues('band_gap', lower > previous_upper, band_names)
+    errors += issues('band_repeated', band_names.duplicated(), band_names)
+
+    for column in ('RR Region 1 Allocation', 'European Common Allocation'):
+        allocations = eca[column]
+
+        # Unbalanced parentheses break the service/footnote parser
+        errors += issues('unbalanced_parentheses', allocations.str.count(r'\(') != allocations.str.count(r'\)'), allocations)
+
+        # Characters without a width make render_service fail
+        characters = set("".join(allocations.unique())) - set(",()")
+        unmeasurable = sorted(char for char in characters if char not in width_lookup)
+        if unmeasurable:
+            pattern = "[" + re.escape("".join(unmeasurable)) + "]"
+            errors += issues('unmeasurable_character', allocations.str.contains(pattern), allocations)
+
+        # Footnotes in the allocations
+        footnotes = allocations.str.findall(r'(?:5\.|ECA)[\w.]+').explode().dropna()
+        warnings += issues('unknown_footnote', ~footnotes.isin(footnotesdict), footnotes)
+
+    # Footnotes of the frequency ranges
+    for column in ('RR Region 1 Footnotes', 'ECA Footnotes'):
+        footnotes = eca[column].str.split(',').explode().str.strip()
+        footnotes = footnotes[footnotes != ""]
+        warnings += issues('unknown_footnote', ~footnotes.isin(footnotesdict), footnotes)
+
+    # Deliverables and standards without a link
+    for check, column, index in (('unknown_deliverable', 'ECC/ERC Harmonisation Measure', docdict),
+                                 ('unknown_standard', 'Standard', hamrstandsdict)):
+        references = eca[column].str.split(',').explode().str.strip()
+        references = references[references != ""]
+        known = {reference: normalize_document_id(reference) in index.entries for reference in references.unique()}
+        warnings += issues(check, ~references.map(known).astype(bool), references)
+
+    # Deliverables and standards of the appendices, they are linked as well
+    doc_types = section_types(data)
+    for check, sections, index in (('unknown_deliverable', ['CEPT'], docdict),
+                                   ('unknown_standard', ['ETSI', 'ETSIwhat'], hamrstandsdict)):
+        references = data.loc[doc_types.isin(sections), 'Lower Frequency'].astype(str).str.strip()
+        references = references[references != ""]
+        known = {reference: normalize_document_id(reference) in index.entries for reference in references.unique()}
+        warnings += issues(check, ~references.map(known).astype(bool), references)
+
+    return errors, warnings
+
+def run_validation(args, width_lookup):
+    """--validate: loads and checks the inputs, prints the report and returns the exit code (0: no errors)."""
+    start = time.perf_counter()
+    eca_file = resolve_input(args.input_ECA_csv, 'LATEST_ECA.csv')
+    report = {'input': eca_file, 'records': 0, 'errors': [], 'warnings': []}
+    try:
+        docdict, hamrstandsdict, footnotesdict, data = load_inputs(args.input_CEPTDocs_csv, args.input_HarmStand_csv, args.input_ECA_csv,
+                                                                   args.docdb_url, args.harmstand_url, args.eca_url, args.chunk_rows)
+    except (OSError, ValueError, KeyError, pd.errors.ParserError) as e:
+        report['errors'].append({'check': 'input', 'record': 0, 'value': str(e)})
+    else:
+        report['errors'] += check_schema(eca_file)
+        report['records'] = len(data)
+        errors, warnings = validate_export(data, footnotesdict, docdict, hamrstandsdict, width_lookup)
+        report['errors'] += errors
+        report['warnings'] += warnings
+    report['seconds'] = round(time.perf_counter() - start, 3)
+
+    print(f"Validation of {eca_file}: {report['records']} records in {report['seconds']} s")
+    for severity in ('errors', 'warnings'):
+        counts = {}
+        for issue in report[severity]:
+            counts.setdefault(issue['check'], []).append(issue)
+        print(f"{len(report[severity])} {severity}")
+        for check, check_issues in sorted(counts.items()):
+            examples = ", ".join(f"#{issue['record']} {issue['value'][:40]!r}" for issue in check_issues[:3])
+            print(f"  {check}: {len(check_issues)} ({examples}{', ...' if len(check_issues) > 3 else ''})")
+
+    if args.validate_report:
+        with open(args.validate_report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+        print(f"Report saved to {args.validate_report}")
+    return 1 if report['errors'] else 0
+
+def split_deliverables(in_string):
+    # same split as wrap_deliverables_info: at the commas, the character after a comma is dropped
+    parts = str(in_string).split(',')
+    return [parts[0]] + [part[1:] for part in parts[1:]]
+
+def section_types(data):
+    """Section of every row of the export, in the order of generate_pdf: ECATable, ECANotes, RR, CEPT, ETSI,
+    ETSIwhat or Abbreviations. The marker rows that start a section ("footnotetext", "title", "description")
+    are None."""
+    types = []
+    doc_type = "ECATable"
+    for marker in data['Upper Frequency']:
+        if marker == "footnotetext":
+            doc_type = "ECANotes" if doc_type == "ECATable" else "RR"
+        elif marker == "title" and doc_type != "ECATable":
+            doc_type = {"RR": "CEPT", "CEPT": "ETSI", "ETSI": "ETSIwhat"}.get(doc_type, doc_type)
+        elif marker == "description" and doc_type != "ECATable":
+            doc_type = "Abbreviations"
+        else:
+            types.append(doc_type)
+            continue
+        types.append(None)
+    return pd.Series(types, index=data.index, dtype=object)
+
+def collect_links(data, docdict, hamrstandsdict):
+    """Returns {url: [(place, reference), ...]} of all links to deliverables and standards of the PDF.
+    The place is the frequency band or the appendix."""
+    # views: collecting must not count as unresolved references of a build
+    docdict = docdict.view()
+    hamrstandsdict = hamrstandsdict.view()
+    links = {}
+
+    def add(url, place, reference):
+        if url is not None:
+            links.setdefault(url, {})[(place, reference)] = None  # ordered set
+
+    appendices = {"CEPT": ("CEPT Deliverables", docdict),
+                  "ETSI": ("European Standards", hamrstandsdict),
+                  "ETSIwhat": ("European Standards for Receive-Only Equipment", hamrstandsdict)}
+    for (_, row), doc_type in zip(data.iterrows(), section_types(data)):
+        if doc_type == "ECATable":
+            band = f"{row['Lower Frequency']} - {row['Upper Frequency']}"
+            for column, index in (('ECC/ERC Harmonisation Measure', docdict), ('Standard', hamrstandsdict)):
+                for reference in split_deliverables(row[column]):
+                    add(index.get(reference), band, reference)
+        elif doc_type in appendices:
+            chapter, index = appendices[doc_type]
+            add(index.get(row['Lower Frequency']), chapter, row['Lower Frequency'])
+    return {url: list(places) for url, places in links.items()}
+
+def check_url(session, url, timeout=15):
+    """Returns (HTTP status, error). HEAD first, GET (without reading the body) if the server refuses HEAD."""
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+        if response.status_code < 400:
+            return response.status_code, None
+        with session.get(url, allow_redirects=True, timeout=timeout, stream=True) as response:
+            return response.status_code, None if response.status_code < 400 else response.reason
+    except requests.exceptions.RequestException as e:
+        return None, type(e).__name__
+
+def check_links(urls, cache_file=None, ttl_hours=24, workers=16):
+    """Checks the urls concurrently with one pooled session. HTTP results younger than ttl_hours are taken from
+    the cache file. Returns {url: {'status', 'error', 'checked'}}."""
+    cache = {}
+    if cache_file:
+        try:
+            with open(cache_file, encoding='utf-8') as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            cache = {}
+    now = time.time()
+    results = {url: cache[url] for url in urls if url in cache and now - cache[url]['checked'] < ttl_hours * 3600}
+    pending = [url for url in urls if url not in results]
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for url, (status, error) in zip(pending, executor.map(lambda url: check_url(session, url), pending)):
+            results[url] = {'status': status, 'error': error, 'checked': now}
+    session.close()
+    print(f"Link check: {len(urls)} links, {len(urls) - len(pending)} from the cache, {len(pending)} checked in {time.time() - now:.1f} s")
+
+    if cache_file:
+        # connection errors and timeouts are checked again on the next run, they may be on our side
+        cache.update({url: result for url, result in results.items() if result['status'] is not None})
+        with open(cache_file, 'w', encoding='utf-8') as file:
+            json.dump(cache, file, indent=1, sort_keys=True)
+    return results
+
+def run_link_check(loaded, cache_file, ttl_hours, workers, report_file=None):
+    """--check-links: checks all links of the PDF and prints the dead ones per band. Returns the number of dead links."""
+    links = collect_links(loaded.data, loaded.docdict, loaded.hamrstandsdict)
+    results = check_links(list(links), cache_file, ttl_hours, workers)
+    dead = {}  # place -> [(reference, url, status or error)]
+    for url, places in links.items():
+        result = results[url]
+        if result['error'] is None:
+            continue
+        for place, reference in places:
+            dead.setdefault(place, []).append((reference, url, result['status'] or result['error']))
+
+    dead_urls = sum(1 for result in results.values() if result['error'] is not None)
+    print(f"{dead_urls} dead links in {len(dead)} bands and appendices")
+    for place, references in dead.items():
+        print(f"  {place}")
+        for reference, url, reason in references:
+            print(f"    {reference}: {url} ({reason})")
+    if report_file:
+        with open(report_file, 'w', encoding='utf-8') as file:
+            json.dump({place: [{'reference': reference, 'url': url, 'reason': reason} for reference, url, reason in references]
+                       for place, references in dead.items()}, file, indent=1)
+        print(f"Link report saved to {report_file}")
+    return dead_urls
+
+# Inverted indexes: the bands of every application, harmonisation measure and standard
+PIVOT_COLUMNS = {'application': 'Applications', 'measure': 'ECC/ERC Harmonisation Measure', 'standard': 'Standard'}
+
+def build_inverted_indexes(data):
+    """{index name: {key: [row labels]}} for the PIVOT_COLUMNS, in one pass over the ECA rows."""
+    indexes = {name: {} for name in PIVOT_COLUMNS}
+    footnote_start = data.index[data['Upper Frequency'] == "footnotetext"]
+    eca = data.loc[:footnote_start[0] - 1] if len(footnote_start) else data
+    columns = [eca.columns.get_loc(column) for column in PIVOT_COLUMNS.values()]
+    for label, *values in zip(eca.index, *(eca.iloc[:, column] for column in columns)):
+        for (name, column), value in zip(PIVOT_COLUMNS.items(), values):
+            keys = [value] if name == 'application' else split_deliverables(value)
+            for key in keys:
+                key = " ".join(str(key).split())
+                if key:
+                    rows = indexes[name].setdefault(key, [])
+                    if not rows or rows[-1] != label:
+                        rows.append(label)
+    return indexes
+
+def index_key_matches(name, key, query):
+    if name == 'application':
+        return key.casefold() == query.casefold()
+    return normalize_document_id(key) == normalize_document_id(query)
+
+def where_cited(data, indexes, query):
+    """{index name: {key: [bands]}} of the keys matching query (e.g. an application or 'ERC/REC 70-03')."""
+    found = {}
+    for name, index in indexes.items():
+        for key, rows in index.items():
+            if index_key_matches(name, key, query):
+                bands = [f"{data.at[row, 'Lower Frequency']} - {data.at[row, 'Upper Frequency']}" for row in rows]
+                found.setdefault(name, {})[key] = list(dict.fromkeys(bands))
+    return found
+
+def generate_pivot_pdf(data, index, index_name, docdict, hamrstandsdict, output_filename, timestamp=None):
+    """One section per key of the inverted index with the table of its bands."""
+    if timestamp is None:
+        timestamp = datetime.now()
+    common_style = ParagraphStyle(name="CommonStyle", fontName="Arial", fontSize=8, leading=9, alignment=TA_LEFT)
+    key_style = ParagraphStyle(name="KeyStyle", fontName="Arial", fontSize=12, leading=14, spaceBefore=10, spaceAfter=4,
+                               textColor=colors.blue)
+    title_style = ParagraphStyle(name="TitleStyle", fontName="Arial", fontSize=16, leading=18, spaceAfter=6,
+                                 textColor=colors.green)
+    table_style = TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONT', (0, 0), (-1, 0), "Arial"),
+        ('SIZE', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightyellow),
+    ])
+    headers = ["Frequency Band", "Application", "CEPT Deliverables", "Standard", "Note"]
+    widths = [120, 170, 130, 110, 250]
+
+    title = f"ECA Table by {PIVOT_COLUMNS[index_name]}"
+    elements = [Paragraph(title, title_style)]
+    bookmarks = []
+    for number, key in enumerate(sorted(index, key=str.casefold)):
+        rows = [headers]
+        for row in index[key]:
+            record = data.loc[row]
+            rows.append([Paragraph(f"{record['Lower Frequency']} - {record['Upper Frequency']}", common_style),
+                         Paragraph(str(record['Applications']), common_style),
+                         Paragraph(wrap_deliverables_info(record['ECC/ERC Harmonisation Measure'], docdict), common_style),
+                         Paragraph(wrap_deliverables_info(record['Standard'], hamrstandsdict), common_style),
+                         Paragraph(str(record['Notes']), common_style)])
+        elements.append(Paragraph(f"{key} ({len(index[key])})", key_style))
+        elements[-1]._bookmark = f"key_{number}"
+        bookmarks.append((f"key_{number}", key))
+        elements.append(Table(rows, colWidths=widths, style=table_style, repeatRows=1))
+
+    def on_first_page(canvas, doc):
+        for bookmark, key in bookmarks:
+            canvas.addOutlineEntry(key, bookmark, level=0, closed=False)
+        on_page(canvas, doc)
+
+    def on_page(canvas, doc):
+        canvas.saveState()
+        canvas.setFont("Arial", 9)
+        canvas.drawRightString(doc.width + doc.leftMargin, 1 * cm, f"Page {doc.page}")
+        canvas.drawString(doc.rightMargin, 1 * cm, f"{title}, report generated:  " + timestamp.strftime("%d.%m. %Y   %H:%M:%S"))
+        canvas.restoreState()
+
+    doc = MyDocTemplate(output_filename, pagesize=landscape(A4), leftMargin=1 * cm, rightMargin=0.6 * cm,
+                        topMargin=1 * cm, bottomMargin=1.5 * cm)
+    doc.build(elements, onFirstPage=on_first_page, onLaterPages=on_page)
+    print(f"Pivot report {output_filename}: {len(index)} {index_name} entries")
+
+def input_fingerprint(input_files, options, glyph_metrics_file=None):
+    """sha256 over the input files, this script, the glyph metrics and the options that change the PDF."""
+    fingerprint = hashlib.sha256()
+    files = list(input_files) + [os.path.abspath(__file__)]
+    if glyph_metrics_file and os.path.exists(glyph_metrics_file):
+        files.append(glyph_metrics_file)
+    for filename in files:
+        with open(filename, 'rb') as file:
+            fingerprint.update(hashlib.sha256(file.read()).digest())
+    fingerprint.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+def reproducible_timestamp(cept_docs_file):
+    """Report time of the reproducible builds, derived from the inputs: SOURCE_DATE_EPOCH if set, otherwise the newest
+    Publish Date of the CEPT documents export. None if neither is available."""
+    if os.environ.get('SOURCE_DATE_EPOCH'):
+        return datetime.fromtimestamp(int(os.environ['SOURCE_DATE_EPOCH']), timezone.utc).replace(tzinfo=None)
+    newest = None
+    try:
+        with open(cept_docs_file, newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile, delimiter=';'):
+                try:
+                    published = datetime.strptime((row.get('Publish Date') or '').strip(), "%Y-%m-%d")
+                except ValueError:
+                    continue
+                newest = published if newest is None else max(newest, published)
+    except OSError:
+        return None
+    return newest
+
+def load_build_state(state_file):
+    try:
+        with open(state_file, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_build_state(state_file, fingerprint, build_time, outputs):
+    with open(state_file, 'w', encoding='utf-8') as file:
+        json.dump({'fingerprint': fingerprint, 'timestamp': build_time.isoformat(), 'outputs': outputs}, file, indent=1)
+
+# Library API: build_eca_pdf() can be called from other programs, also concurrently from several threads.
+# All settings are passed explicitly, the parsed inputs and the character widths are kept in an ECABuildCache.
+
+@dataclass(frozen=True)
+class ECAInputs:
+    """The three csv inputs. LATEST downloads the current export from the url."""
+    eca_csv: str = 'LATEST'
+    harmstand_csv: str = 'LATEST'
+    cept_docs_csv: str = 'LATEST'
+    docdb_url: str = DOCDB_URL
+    harmstand_url: str = HARMSTAND_URL
+    eca_url: str = ECA_URL
+    chunk_rows: int = None  # read the ECA table in batches of this many rows with categorical columns
+
+    def files(self):
+        return [resolve_input(self.cept_docs_csv, 'LATEST_docDB.csv'),
+                resolve_input(self.harmstand_csv, 'LATEST_hEN.csv'),
+                resolve_input(self.eca_csv, 'LATEST_ECA.csv')]
+
+@dataclass(frozen=True)
+class PDFOptions:
+    optimize_size: bool = False
+    reproducible: bool = False
+    timestamp: datetime = None  # time in the footer (and creation date if reproducible), None: time of the build
+    glyph_metrics: str = 'glyph_metrics.bin'
+    auto_layout: bool = False  # column widths from the content instead of the fixed widths
+
+@dataclass
+class ECAData:
+    docdict: DocumentIndex
+    hamrstandsdict: DocumentIndex
+    footnotesdict: dict
+    data: pd.DataFrame
+    files: list
+    indexes: dict  # inverted indexes of build_inverted_indexes
+
+@dataclass
+class BuildResult:
+    output_filename: str
+    timestamp: datetime
+    unresolved: dict  # 'CEPT deliverables' / 'Harmonised standards' -> {reference: count}
+
+class ECABuildCache:
+    """Parsed inputs and character widths shared by the builds of a process. Local inputs are parsed again when
+    the file changes, LATEST inputs are only downloaded again with refresh=True."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = {}  # ECAInputs -> (file states, ECAData)
+        self.width_tables = {}  # glyph metrics file -> width lookup
+        self.layouts = {}  # (ECAInputs, glyph metrics file) -> (ECAData, column widths of checked_auto_layout)
+
+    @staticmethod
+    def file_states(files):
+        states = []
+        for filename in files:
+            try:
+                stat = os.stat(filename)
+                states.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                states.append(None)
+        return states
+
+    def load(self, inputs, refresh=False):
+        with self.lock:
+            cached = self.loaded.get(inputs)
+            if cached is not None and not refresh and cached[0] == self.file_states(cached[1].files):
+                return cached[1]
+            docdict, hamrstandsdict, footnotesdict, data = load_inputs(inputs.cept_docs_csv, inputs.harmstand_csv, inputs.eca_csv,
+                                                                       inputs.docdb_url, inputs.harmstand_url, inputs.eca_url,
+                                                                       inputs.chunk_rows)
+            loaded = ECAData(docdict, hamrstandsdict, footnotesdict, data, inputs.files(), build_inverted_indexes(data))
+            self.loaded[inputs] = (self.file_states(loaded.files), loaded)
+            return loaded
+
+    def width_table(self, metrics_filename):
+        with self.lock:
+            if metrics_filename not in self.width_tables:
+                self.width_tables[metrics_filename] = make_charwidth_lookup_table(metrics_filename)
+            return self.width_tables[metrics_filename]
+
+    def auto_layout(self, inputs, loaded, metrics_filename):
+        """Column widths of --auto-layout, computed once for the loaded inputs."""
+        width_lookup = self.width_table(metrics_filename)
+        with self.lock:
+            cached = self.layouts.get((inputs, metrics_filename))
+            if cached is None or cached[0] is not loaded:
+                cached = (loaded, checked_auto_layout(loaded.data, loaded.docdict, loaded.hamrstandsdict, loaded.footnotesdict, width_lookup))
+                self.layouts[(inputs, metrics_filename)] = cached
+            return cached[1]
+
+def build_eca_pdf(output_filename, inputs=None, options=None, cache=None):
+    """Builds the ECA table PDF and returns a BuildResult. Pass the same cache to reuse the parsed inputs."""
+    inputs = inputs or ECAInputs()
+    options = options or PDFOptions()
+    cache = cache or ECABuildCache()
+    loaded = cache.load(inputs)
+    build_time = options.timestamp
+    if build_time is None and options.reproducible:
+        build_time = reproducible_timestamp(loaded.files[0])
+    build_time = build_time or datetime.now().replace(microsecond=0)
+    # the unresolved references are counted per build
+    docdict = loaded.docdict.view()
+    hamrstandsdict = loaded.hamrstandsdict.view()
+    column_widths = cache.auto_layout(inputs, loaded, options.glyph_metrics) if options.auto_layout else None
+    generate_pdf(loaded.data, docdict, hamrstandsdict, loaded.footnotesdict, output_filename, options.optimize_size,
+                 cache.width_table(options.glyph_metrics), options.reproducible, build_time, options.auto_layout, column_widths)
+    return BuildResult(output_filename, build_time, {"CEPT deliverables": docdict.unresolved,
+                                                     "Harmonised standards": hamrstandsdict.unresolved})
+
+def build_pivot_reports(index_names, output_dir, inputs=None, options=None, cache=None):
+    """Writes <output_dir>/ECATable_by_<index name>.pdf for every index name of PIVOT_COLUMNS. Returns the files."""
+    inputs = inputs or ECAInputs()
+    options = options or PDFOptions()
+    cache = cache or ECABuildCache()
+    loaded = cache.load(inputs)
+    build_time = options.timestamp or datetime.now().replace(microsecond=0)
+    os.makedirs(output_dir, exist_ok=True)
+    output_files = []
+    for index_name in index_names:
+        output_filename = os.path.join(output_dir, f"ECATable_by_{index_name}.pdf")
+        generate_pivot_pdf(loaded.data, loaded.indexes[index_name], index_name, loaded.docdict.view(), loaded.hamrstandsdict.view(),
+                           output_filename, build_time)
+        output_files.append(output_filename)
+    return output_files
+
 # Argument parsing setup
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Generate a frequency allocation PDF from CSV data.")
@@ -813,8 +1886,51 @@ def parse_arguments():
     # Argument for input CSV CEPT Docs file
     parser.add_argument('--input-CEPTDocs-csv', type=str, default='LATEST', help="Path to the input CSV CEPT documents data file. LATEST to get the latest from ECO")
 
+    # Optional argument to write a smaller PDF (shared forms, object streams) and report its composition
+    parser.add_argument('--optimize-size', action='store_true', help="Flag to reduce the size of the PDF file and print a size report. Object streams need pikepdf.")
+
+    # Arguments for the ECO export urls used for LATEST (e.g. a local mirror or test server)
+    parser.add_argument('--docdb-url', type=str, default=DOCDB_URL, help="URL of the CEPT documents export used for LATEST.")
+    parser.add_argument('--harmstand-url', type=str, default=HARMSTAND_URL, help="URL of the harmonised standards export used for LATEST.")
+    parser.add_argument('--eca-url', type=str, default=ECA_URL, help="URL of the ECA table export used for LATEST.")
+
+    # Optional argument to read the ECA table in batches (large multi-year archives)
+    parser.add_argument('--chunk-rows', type=int, default=None, help="Read the ECA table export in batches of this many rows and keep the repetitive columns as categoricals, e.g. 50000. The PDF build itself uses as much memory as without it. Default is to read the whole file at once.")
+
+    # Argument for the glyph metrics compiled by helper/characterDict.py
+    parser.add_argument('--glyph-metrics', type=str, default='glyph_metrics.bin', help="Path to the glyph metrics file of helper/characterDict.py. If it does not exist, the font is measured.")
+
+    # Optional argument to only check the inputs (no PDF)
+    parser.add_argument('--validate', action='store_true', help="Flag to only check the inputs for inconsistencies. Exit code 1 if errors were found.")
+
+    # Optional argument for the JSON report of --validate
+    parser.add_argument('--validate-report', type=str, default=None, help="Path to the JSON report of --validate.")
+
+    # Optional argument to compute the column widths from the content
+    parser.add_argument('--auto-layout', action='store_true', help="Flag to choose the column widths that minimize the estimated height of the tables, kept only if the PDF has fewer pages than with the fixed widths. The widths are computed once per run.")
+
+    # Optional arguments of the pivot report mode (no ECA table PDF)
+    parser.add_argument('--where', type=str, default=None, help="Print the bands of an application, harmonisation measure or standard, e.g. \"ERC/REC 70-03\".")
+    parser.add_argument('--pivot', choices=sorted(PIVOT_COLUMNS), action='append', default=None, help="Write a report with the bands of every application, measure or standard. Can be given several times.")
+    parser.add_argument('--pivot-dir', type=str, default='../out', help="Directory of the --pivot reports. Default is '../out'.")
+
+    # Optional argument to check all links to deliverables and standards before the PDF is generated
+    parser.add_argument('--check-links', action='store_true', help="Flag to check all links of the PDF (concurrently, cached) and report the dead links per band.")
+
+    # Options of --check-links
+    parser.add_argument('--link-cache', type=str, default='link_check_cache.json', help="Path to the result cache of --check-links. Default is 'link_check_cache.json'.")
+    parser.add_argument('--link-cache-ttl', type=float, default=24, help="Hours a cached link check result is used. Default is 24.")
+    parser.add_argument('--link-workers', type=int, default=16, help="Number of concurrent requests of --check-links. Default is 16.")
+    parser.add_argument('--link-report', type=str, default=None, help="Path to the JSON report of the dead links per band.")
+
     # Argument for output PDF file
-    parser.add_argument('--output-pdf', type=str, default='../output/'+timestamp.strftime("%Y%m%d_%H%M%S")+'_output.pdf', help="Path to the output PDF file. Default is '_output.pdf'.")
+    parser.add_argument('--output-pdf', type=str, default=None, help="Path to the output PDF file. Default is '../output/<timestamp>_output.pdf'.")
+
+    # Optional argument for reproducible builds
+    parser.add_argument('--reproducible', action='store_true', help="Flag for byte identical PDFs from identical inputs. The build is skipped if the inputs did not change since the last build.")
+
+    # Argument for the state of the last reproducible build
+    parser.add_argument('--build-state', type=str, default='../out/ECATable.build.json', help="Path to the state file of --reproducible. Default is '../out/ECATable.build.json'.")
 
     # Parse the arguments and return them
     return parser.parse_args()
@@ -824,42 +1940,66 @@ def main():
     args = parse_arguments()
 
     # Accessing the parsed arguments
-    input_csv = args.input_ECA_csv
-    output_pdf = args.output_pdf
+    inputs = ECAInputs(args.input_ECA_csv, args.input_HarmStand_csv, args.input_CEPTDocs_csv,
+                       args.docdb_url, args.harmstand_url, args.eca_url, args.chunk_rows)
     #manipulate_data = args.manipulate_data
 
-    input_db_csv = args.input_CEPTDocs_csv
-    print(f"Read Document Database: {input_db_csv}")
-    if (input_db_csv=='LATEST'):
-        input_db_csv = os.path.join('.', 'LATEST_docDB.csv')
-        download_file('https://docdb.cept.org/search/exportall', input_db_csv)
-
-    docdict = create_docdb_dict(input_db_csv)
-
-    input_harmstand_csv = args.input_HarmStand_csv
-    print(f"Read Document Database: {input_harmstand_csv}")
-    if (input_harmstand_csv=='LATEST'):
-        input_harmstand_csv = os.path.join('.', 'LATEST_hEN.csv')
-        download_file('https://docdb.cept.org/frequencies/export', input_harmstand_csv)
-
-    hamrstandsdict = create_hamrstands_dict(input_harmstand_csv)
-
-    #print(docdict)
+    if args.validate:
+        sys.exit(run_validation(args, make_charwidth_lookup_table(args.glyph_metrics)))
+
+    # Fetch the inputs concurrently, each is parsed as soon as it is downloaded
+    cache = ECABuildCache()
+    loaded = cache.load(inputs)
+
+    if args.check_links:
+        run_link_check(loaded, args.link_cache, args.link_cache_ttl, args.link_workers, args.link_report)
+
+    # Pivot report mode: answered from the inverted indexes, the ECA table PDF is not generated
+    if args.where or args.pivot:
+        if args.where:
+            found = where_cited(loaded.data, loaded.indexes, args.where)
+            if not found:
+                print(f"{args.where!r} is not cited in the ECA table.")
+            for index_name, keys in found.items():
+                for key, bands in keys.items():
+                    print(f"{PIVOT_COLUMNS[index_name]} {key!r}: {len(bands)} bands")
+                    for band in bands:
+                        print(f"  {band}")
+        if args.pivot:
+            build_pivot_reports(args.pivot, args.pivot_dir, inputs, PDFOptions(glyph_metrics=args.glyph_metrics), cache)
+        return
+
+    timestamp = datetime.now().replace(microsecond=0)
+    if args.reproducible:
+        # The footer time is derived from the inputs (SOURCE_DATE_EPOCH or the newest publication of the CEPT
+        # documents), so the same inputs always give the same bytes, on any machine.
+        timestamp = reproducible_timestamp(loaded.files[0])
+        if timestamp is None:
+            print(f"--reproducible: no Publish Date in {loaded.files[0]}, set SOURCE_DATE_EPOCH.")
+            sys.exit(1)
+        fingerprint = input_fingerprint(loaded.files, {'optimize_size': args.optimize_size, 'auto_layout': args.auto_layout, 'output_pdf': args.output_pdf, 'reportlab': reportlab_version, 'source_date_epoch': os.environ.get('SOURCE_DATE_EPOCH')}, args.glyph_metrics)
+        build_state = load_build_state(args.build_state)
+        if build_state.get('fingerprint') == fingerprint:
+            if all(os.path.exists(output) for output in build_state.get('outputs', [])):
+                print(f"Inputs unchanged since the build of {build_state['timestamp']} (fingerprint {fingerprint[:12]}): nothing to do.")
+                return
+
+    output_pdf = args.output_pdf or '../output/'+timestamp.strftime("%Y%m%d_%H%M%S")+'_output.pdf'
+    options = PDFOptions(args.optimize_size, args.reproducible, timestamp, args.glyph_metrics, args.auto_layout)
 
-    # Process input data
-    print(f"Processing input file: {input_csv}")
-    if (input_csv=='LATEST'):
-        input_csv = os.path.join('.', 'LATEST_ECA.csv')
-        download_file('https://efis.cept.org/reports/ReportDownloader?reportid=3', input_csv)
-    
-    footnotesdict = create_footnotes_dict(input_csv)
-
-    data = process_csv(input_csv)  # Replace with your CSV processing function
-   
     # Generate the PDF
     print(f"Generating PDF: {output_pdf}")
-    generate_pdf(data, docdict, hamrstandsdict, footnotesdict, output_pdf)
-    generate_pdf(data, docdict, hamrstandsdict, footnotesdict, '../out/ECATable.pdf')
+    results = [build_eca_pdf(output_filename, inputs, options, cache) for output_filename in (output_pdf, '../out/ECATable.pdf')]
+
+    if args.reproducible:
+        save_build_state(args.build_state, fingerprint, timestamp, [output_pdf, '../out/ECATable.pdf'])
+
+    # Report the references without a link (counted over both PDFs)
+    for name in ("CEPT deliverables", "Harmonised standards"):
+        unresolved = Counter()
+        for result in results:
+            unresolved.update(result.unresolved[name])
+        report_unresolved(name, unresolved)
 
 if __name__ == "__main__":
     main()